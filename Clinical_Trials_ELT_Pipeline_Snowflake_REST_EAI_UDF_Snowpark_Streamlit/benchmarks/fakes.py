@@ -0,0 +1,408 @@
+# Fake Snowpark session and Streamlit runtime for running the dashboard offline.
+# FakeSession serves synthetic pandas tables through the small part of the Snowpark
+# DataFrame API the app uses, and records every query it runs and the bytes it returns.
+# install_fakes() registers in-process stand-ins for streamlit, plotly and snowpark,
+# so load_app() can execute streamlit/streamlit_app.py for one tab without Snowflake,
+# and run_app() can rerun it against the same caches and session state.
+import contextlib
+import functools
+import os
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "streamlit", "streamlit_app.py")
+
+# Columns of each normalized table; the wide free-text columns are what column
+# projection saves on
+TABLE_COLUMNS = {
+    "clinical_trial_core_normalized": [
+        "NCT_ID", "BRIEF_TITLE", "OFFICIAL_TITLE", "BRIEF_SUMMARY", "DETAILED_DESCRIPTION",
+        "CONDITIONS", "CONDITIONS_SPECIFICS", "KEYWORDS", "OVERALL_STATUS", "START_DATE",
+        "COMPLETION_DATE", "PRINCIPAL_INVESTIGATOR", "LEAD_SPONSOR", "COLLABORATORS",
+        "RAW_PROTOCOL_SECTION",
+    ],
+    "clinical_trials_locations_normalized": [
+        "NCT_ID", "FACILITY", "CITY", "STATE", "COUNTRY", "ZIP", "STATUS",
+        "CONTACT_NAME", "CONTACT_EMAIL", "LATITUDE", "LONGITUDE",
+    ],
+    "clinical_trial_design_normalized": [
+        "NCT_ID", "STUDY_TYPE", "PHASES", "ENROLLMENT_INFO", "PRIMARY_PURPOSE",
+        "MASKING_INFO", "INTERVENTION_MODEL", "INTERVENTION_TYPE", "INTERVENTION_NAME",
+        "INTERVENTION_OTHER_NAMES", "INTERVENTION_DESCRIPTION", "ARM_GROUPS", "SEX",
+        "MIN_AGE", "MAX_AGE", "HEALTHY_VOLUNTEERS", "ELIGIBILITY_CRITERIA", "RAW_DESIGN_MODULE",
+    ],
+    "clinical_trials_design_outcomes_normalized": [
+        "NCT_ID", "OUTCOME_TYPE", "MEASURE", "DESCRIPTION", "TIME_FRAME",
+    ],
+    "clinical_trials_outcome_measures_normalized": [
+        "NCT_ID", "OUTCOME_TYPE", "OUTCOME_TITLE", "OUTCOME_DESCRIPTION", "REPORTING_STATUS",
+        "TIME_FRAME", "POPULATION_DESCRIPTION", "PARAM_TYPE", "PARAM_UNIT_OF_MEASURE",
+        "CLASS_TITLE", "MEASUREMENT_VALUE",
+    ],
+    "clinical_trials_baseline_measures_normalized": [
+        "NCT_ID", "PARAM_TITLE", "CATEGORY_TITLE", "PARAM_TYPE", "UNIT_OF_MEASURE", "VALUE",
+    ],
+    "clinical_trials_adverse_events_normalized": [
+        "NCT_ID", "ADVERSE_EVENT_DESCRIPTION", "TIME_FRAME", "FREQUENCY_THRESHOLD",
+        "ADVERSE_EVENT_TYPE", "ORGAN_SYSTEM", "TERM", "AFFECTED_PARTICIPANTS", "AT_RISK_PARTICIPANTS",
+    ],
+    "clinical_trials_limitations_normalized": ["NCT_ID", "DESCRIPTION"],
+    "clinical_trials_documents_normalized": ["NCT_ID", "DOCUMENT_TYPE", "DOCUMENT_DATE", "URL", "SIZE"],
+}
+
+# Distinct values of the low-cardinality columns the charts group by
+CATEGORIES = {
+    "OUTCOME_TYPE": ["PRIMARY", "SECONDARY", "OTHER"],
+    "ADVERSE_EVENT_TYPE": ["SERIOUS", "OTHER"],
+    "ORGAN_SYSTEM": ["Cardiac disorders", "Infections", "Nervous system disorders", "General disorders"],
+    "PARAM_TITLE": ["Age", "Sex", "Race (NIH/OMB)", "Region of Enrollment"],
+    "CATEGORY_TITLE": ["White", "Black or African American", "Asian", "Unknown"],
+    "CLASS_TITLE": ["Placebo", "Low dose", "High dose"],
+    "PARAM_TYPE": ["COUNT_OF_PARTICIPANTS", "MEAN", "MEDIAN"],
+    "REPORTING_STATUS": ["POSTED"],
+    "DOCUMENT_TYPE": ["Study Protocol", "Statistical Analysis Plan", "Informed Consent Form"],
+}
+NUMERIC_COLUMNS = {"LATITUDE", "LONGITUDE", "MEASUREMENT_VALUE", "VALUE",
+                   "AFFECTED_PARTICIPANTS", "AT_RISK_PARTICIPANTS", "SIZE"}
+# Free-text columns get long values, as protocol sections do
+LONG_TEXT_WORDS = 120
+WORDS = ("pain week dose patients placebo response change baseline score treatment "
+         "adverse serious efficacy safety month randomized participants measure").split()
+
+
+def synthetic_table(name, study_ids, rows_per_study, seed=0):
+    """A synthetic normalized table with `rows_per_study` rows for each study."""
+    rng = np.random.default_rng(seed)
+    rows = len(study_ids) * rows_per_study
+    data = {"NCT_ID": np.repeat(study_ids, rows_per_study)}
+    for column in TABLE_COLUMNS[name][1:]:
+        if column in NUMERIC_COLUMNS:
+            data[column] = rng.integers(0, 500, rows).astype(str)
+        elif column in CATEGORIES:
+            data[column] = rng.choice(CATEGORIES[column], rows)
+        else:
+            words = LONG_TEXT_WORDS if column.startswith(("RAW_", "DETAILED", "ELIGIBILITY", "BRIEF_SUMMARY")) else 6
+            data[column] = [
+                " ".join(rng.choice(WORDS, words)) + f" {column.lower()} {i}" for i in range(rows)
+            ]
+    return pd.DataFrame(data)
+
+
+def synthetic_tables(studies=20, rows_per_study=200, seed=0):
+    study_ids = [f"NCT{i:08d}" for i in range(studies)]
+    return {
+        name: synthetic_table(name, study_ids, 1 if name == "clinical_trial_core_normalized" else rows_per_study, seed)
+        for name in TABLE_COLUMNS
+    }
+
+
+# ---------------------------
+# Snowpark stand-ins
+# ---------------------------
+class Column:
+    """Deferred column expression, evaluated against a pandas DataFrame."""
+
+    def __init__(self, evaluate, name):
+        self.evaluate = evaluate
+        self.name = name
+
+    def __eq__(self, other):
+        return Column(lambda df: self.evaluate(df) == value_of(other, df), f"{self.name} = {other!r}")
+
+    def __or__(self, other):
+        return Column(lambda df: self.evaluate(df) | other.evaluate(df), f"({self.name} OR {other.name})")
+
+    def ilike(self, pattern):
+        needle = pattern.evaluate(None).strip("%").lower()
+        return Column(lambda df: self.evaluate(df).astype(str).str.lower().str.contains(needle, regex=False),
+                      f"{self.name} ILIKE '%{needle}%'")
+
+    def cast(self, _type):
+        return Column(lambda df: pd.to_numeric(self.evaluate(df), errors="coerce"), self.name)
+
+    def alias(self, name):
+        aliased = Column(self.evaluate, name)
+        aliased.aggregate = getattr(self, "aggregate", None)
+        return aliased
+
+
+def value_of(value, df):
+    return value.evaluate(df) if isinstance(value, Column) else value
+
+
+def col(name):
+    return Column(lambda df: df[name], name)
+
+
+def lit(value):
+    return Column(lambda df: value, repr(value))
+
+
+def count(_column):
+    column = Column(None, "COUNT")
+    column.aggregate = lambda frame, keys: frame.groupby(keys, observed=True).size()
+    return column
+
+
+def sum_(column):
+    result = Column(None, f"SUM({column.name})")
+    result.aggregate = lambda frame, keys: (
+        frame.assign(_value=column.evaluate(frame)).groupby(keys, observed=True)["_value"].sum()
+    )
+    return result
+
+
+class Row(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class FakeDataFrame:
+    """Lazy DataFrame over a pandas table; fetching it records one query."""
+
+    def __init__(self, session, source, steps, description):
+        self.session = session
+        self.source = source
+        self.steps = steps
+        self.description = description
+
+    def then(self, step, description):
+        return FakeDataFrame(self.session, self.source, self.steps + [step], f"{self.description} {description}")
+
+    def filter(self, condition):
+        return self.then(lambda df: df[condition.evaluate(df)], f"WHERE {condition.name}")
+
+    def select(self, *columns):
+        names = [c.name if isinstance(c, Column) else c for c in
+                 (columns[0] if len(columns) == 1 and isinstance(columns[0], list) else columns)]
+        return self.then(lambda df: df[names], f"SELECT {', '.join(names)}")
+
+    def distinct(self):
+        return self.then(lambda df: df.drop_duplicates(), "DISTINCT")
+
+    def sort(self, *columns):
+        names = columns[0] if len(columns) == 1 and isinstance(columns[0], list) else list(columns)
+        names = [c.name if isinstance(c, Column) else c for c in names]
+        return self.then(lambda df: df.sort_values(names), f"ORDER BY {', '.join(names)}")
+
+    def limit(self, n):
+        return self.then(lambda df: df.head(n), f"LIMIT {n}")
+
+    def count(self):
+        rows = len(self.compute())
+        self.session.record(f"SELECT COUNT(*) {self.description}", pd.DataFrame({"COUNT": [rows]}))
+        return rows
+
+    def group_by(self, keys):
+        return GroupedData(self, list(keys))
+
+    def compute(self):
+        df = self.source()
+        for step in self.steps:
+            df = step(df)
+        return df.reset_index(drop=True)
+
+    def to_pandas(self):
+        return self.session.record(self.description, self.compute())
+
+    def to_pandas_batches(self, batch_rows=None):
+        df = self.to_pandas()
+        batch_rows = batch_rows or self.session.batch_rows
+        for start in range(0, len(df), batch_rows):
+            yield df.iloc[start:start + batch_rows].reset_index(drop=True).copy()
+
+    def collect(self):
+        return [Row(row) for row in self.to_pandas().to_dict("records")]
+
+
+class GroupedData:
+    def __init__(self, df, keys):
+        self.df = df
+        self.keys = keys
+
+    def agg(self, aggregate):
+        def step(frame):
+            return aggregate.aggregate(frame, self.keys).rename(aggregate.name).reset_index()
+        return self.df.then(step, f"GROUP BY {', '.join(self.keys)} AGG {aggregate.name}")
+
+
+class FakeSession:
+    """Serves `tables` and records (tab, query, rows, bytes) for every fetch."""
+
+    def __init__(self, tables, batch_rows=10_000):
+        self.tables = tables
+        self.batch_rows = batch_rows
+        self.queries = []
+        self.tab = None
+        self.versions = {name.upper(): "2025-01-01 00:00:00" for name in tables}
+
+    def table(self, name):
+        return FakeDataFrame(self, lambda: self.tables[name], [], f"FROM {name}")
+
+    def sql(self, query):
+        versions = pd.DataFrame(
+            {"TABLE_NAME": list(self.versions), "LAST_ALTERED": list(self.versions.values())}
+        )
+        return FakeDataFrame(self, lambda: versions, [], " ".join(query.split()))
+
+    def record(self, description, df):
+        self.queries.append({
+            "TAB": self.tab,
+            "QUERY": description,
+            "ROWS": len(df),
+            "BYTES": int(df.memory_usage(deep=True).sum()),
+        })
+        return df
+
+
+# ---------------------------
+# Streamlit stand-ins
+# ---------------------------
+class StopScript(Exception):
+    pass
+
+
+class SessionState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class Element:
+    """Any container or element; usable as a context manager and chainable.
+    `drawn` counts the elements drawn, and `rows` the dataframe rows sent."""
+
+    drawn = 0
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return draw(name)
+
+
+def draw(name):
+    def render(*args, **kwargs):
+        Element.drawn += 1
+        if name == "dataframe" and args and hasattr(args[0], "__len__"):
+            Element.rows += len(args[0])
+        return Element()
+    return render
+
+
+def cache(func=None, **_options):
+    def decorate(func):
+        memo = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            if args not in memo:
+                memo[args] = func(*args)
+            return memo[args]
+
+        wrapper.clear = memo.clear
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+def fake_streamlit(widgets):
+    """
+    A streamlit module whose widgets return `widgets[key]` or their default, where
+    the key is the widget key if it has one and "<widget>:<label>" otherwise.
+    """
+    st = types.ModuleType("streamlit")
+    st.session_state = SessionState()
+    st.cache_data = cache
+    st.cache_resource = cache
+    st.fragment = lambda func: func
+    st.sidebar = Element()
+
+    def stop():
+        raise StopScript()
+
+    def widget(kind, default):
+        def render(label="", options=None, *args, **kwargs):
+            Element.drawn += 1
+            key = kwargs.get("key") or f"{kind}:{label}"
+            value = widgets.get(key, default(options) if callable(default) else default)
+            if kwargs.get("key"):
+                st.session_state[kwargs["key"]] = value
+            return value
+        return render
+
+    st.stop = stop
+    st.selectbox = widget("selectbox", lambda options: list(options)[0] if options else None)
+    st.radio = widget("radio", lambda options: list(options)[0])
+    st.toggle = widget("toggle", False)
+    st.text_input = widget("text_input", "")
+    st.__getattr__ = draw
+    return st
+
+
+def install_fakes(session, widgets=None):
+    """Register the stand-in modules and return the fake streamlit module."""
+    st = fake_streamlit(widgets if widgets is not None else {})
+    snowflake = types.ModuleType("snowflake")
+    snowpark = types.ModuleType("snowflake.snowpark")
+    context = types.ModuleType("snowflake.snowpark.context")
+    context.get_active_session = lambda: session
+    functions = types.ModuleType("snowflake.snowpark.functions")
+    functions.col, functions.lit, functions.count, functions.sum = col, lit, count, sum_
+    plotly = types.ModuleType("plotly")
+    express = types.ModuleType("plotly.express")
+    express.pie = express.bar = lambda *args, **kwargs: Element()
+    sys.modules.update({
+        "streamlit": st,
+        "snowflake": snowflake,
+        "snowflake.snowpark": snowpark,
+        "snowflake.snowpark.context": context,
+        "snowflake.snowpark.functions": functions,
+        "plotly": plotly,
+        "plotly.express": express,
+    })
+    return st
+
+
+def load_app(session, tab=None, widgets=None):
+    """
+    Run the dashboard script once, as a new browser session would, and return its
+    globals. `tab` selects the tab to render; queries are recorded against it.
+    """
+    widgets = dict(widgets or {})
+    if tab is not None:
+        widgets["radio:"] = tab
+    install_fakes(session, widgets)
+    session.tab = tab
+    return run_app()
+
+
+def run_app():
+    """
+    Run the dashboard script against the installed fakes and return its globals.
+    Caches and session state persist between runs, as across a session's reruns,
+    and widgets read the dict given to install_fakes() as it is at that time.
+    """
+    namespace = {"__name__": "streamlit_app", "__file__": APP_PATH}
+    with contextlib.suppress(StopScript):
+        exec(compiled_app(), namespace)
+    return namespace
+
+
+@functools.lru_cache(maxsize=1)
+def compiled_app():
+    # Streamlit also compiles the script once and reruns the bytecode
+    with open(APP_PATH) as f:
+        return compile(f.read(), APP_PATH, "exec")
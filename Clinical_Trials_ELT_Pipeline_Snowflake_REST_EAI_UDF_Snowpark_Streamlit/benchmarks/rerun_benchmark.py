@@ -0,0 +1,80 @@
+# Rerun latency per interaction, as a full-script rerun (what every widget change
+# caused before the tabs became fragments) and as a rerun of the tab's fragment only.
+# Each interaction is replayed in one session with warm caches, so the numbers are
+# the Python work of the rerun; the elements drawn and dataframe rows sent show what
+# each rerun would also cost to deliver to the browser, which the fakes do not draw.
+#
+#   python benchmarks/rerun_benchmark.py [--studies 20] [--rows-per-study 2000] [--repeat 5]
+import argparse
+import statistics
+import time
+
+from fakes import Element, FakeSession, install_fakes, run_app, synthetic_tables
+
+# (interaction, tab, its renderer, widget key, values the user sets in turn)
+INTERACTIONS = [
+    ("Search keystroke", "Outcomes", "render_outcomes", "text_input:",
+     ["p", "pa", "pai", "pain", "pain w", "pain we", "pain wee", "pain week"]),
+    ("Event-type filter", "Adverse Events", "render_adverse_events", "selectbox:",
+     ["SERIOUS", "OTHER", "All"]),
+    ("Full-table toggle", "Overview", "render_overview", "full_core", [True, False]),
+]
+
+
+def timed(rerun):
+    """Milliseconds, elements drawn and dataframe rows sent by one rerun."""
+    drawn, rows = Element.drawn, Element.rows
+    start = time.perf_counter()
+    rerun()
+    return (time.perf_counter() - start) * 1000, Element.drawn - drawn, Element.rows - rows
+
+
+def measure(tables, tab, renderer, key, values, repeat):
+    """Per mode, the median rerun and the elements and rows per rerun."""
+    session = FakeSession(tables)
+    session.tab = tab
+    widgets = {"radio:": tab}
+    install_fakes(session, widgets)
+    app = run_app()
+    nct_id = app["nct_id"]
+    modes = {
+        "full script": run_app,
+        "fragment": lambda: app[renderer](nct_id),
+    }
+    for value in values:  # warm the caches every value needs
+        widgets[key] = value
+        run_app()
+    results = {mode: [] for mode in modes}
+    for _ in range(repeat):
+        for value in values:
+            widgets[key] = value
+            for mode, rerun in modes.items():
+                results[mode].append(timed(rerun))
+    return {
+        mode: (
+            statistics.median(ms for ms, _, _ in runs),
+            statistics.mean(drawn for _, drawn, _ in runs),
+            statistics.mean(rows for _, _, rows in runs),
+        )
+        for mode, runs in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--studies", type=int, default=20)
+    parser.add_argument("--rows-per-study", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5, help="passes over each interaction's values")
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.studies, args.rows_per_study)
+    print(f"{args.studies} studies, {args.rows_per_study:,} rows per study and table")
+    print(f"{'interaction':<18} {'rerun':<12} {'p50 ms':>8} {'elements':>9} {'df rows':>8}")
+    for name, tab, renderer, key, values in INTERACTIONS:
+        for mode, (ms, drawn, rows) in measure(tables, tab, renderer, key, values, args.repeat).items():
+            print(f"{name:<18} {mode:<12} {ms:>8.2f} {drawn:>9.1f} {rows:>8.1f}")
+            name = ""
+
+
+if __name__ == "__main__":
+    main()
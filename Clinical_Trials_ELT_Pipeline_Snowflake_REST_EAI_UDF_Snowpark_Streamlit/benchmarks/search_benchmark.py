@@ -0,0 +1,60 @@
+# "Search Outcomes" benchmark: the inverted index against the previous row-wise
+# `apply` filter, on synthetic outcome tables of 10k, 100k and 1M rows.
+# The index and matching code are the dashboard's own, run through the fake session.
+#
+#   python benchmarks/search_benchmark.py [--rows 10000 100000 1000000] [--apply-max-rows 10000]
+import argparse
+import time
+
+from fakes import FakeSession, load_app, synthetic_table
+
+OUTCOMES = "clinical_trials_outcome_measures_normalized"
+CORE = "clinical_trial_core_normalized"
+QUERIES = ["pain", "pain week", "title:dose", "placebo change baseline"]
+
+
+def apply_search(df, search):
+    # The filter the Outcomes tab used before the index
+    return df[df.apply(lambda row: search.lower() in row.astype(str).str.lower().to_string(), axis=1)]
+
+
+def seconds(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--apply-max-rows", type=int, default=10_000,
+                        help="time apply on at most this many rows and extrapolate linearly")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'index build':>12} {'index query':>12} {'apply query':>14}  speedup")
+    for rows in args.rows:
+        study = ["NCT00000000"]
+        tables = {CORE: synthetic_table(CORE, study, 1), OUTCOMES: synthetic_table(OUTCOMES, study, rows)}
+        app = load_app(FakeSession(tables))
+        df = app["load_table"](OUTCOMES, study[0])
+        columns = app["OUTCOME_SEARCH_COLUMNS"]
+
+        build, index = seconds(lambda: app["index_columns"](df, columns))
+        query = sum(
+            seconds(lambda: df.iloc[app["match_rows"](index, app["parse_search_query"](q, columns))], 3)[0]
+            for q in QUERIES
+        ) / len(QUERIES)
+
+        sample = df.head(min(rows, args.apply_max_rows))
+        apply = sum(seconds(lambda: apply_search(sample, q))[0] for q in QUERIES) / len(QUERIES)
+        apply *= rows / len(sample)
+        estimated = "*" if len(sample) < rows else " "
+        print(f"{rows:>9} {build:>11.2f}s {query * 1000:>10.1f}ms {apply:>12.2f}s{estimated} {apply / query:>8.0f}x")
+    print("\nindex query: per keystroke once the index is built (cached per table version)")
+    print("* extrapolated from --apply-max-rows rows")
+    print(f"Above {app['SEARCH_PUSHDOWN_ROWS']} rows the dashboard searches in Snowflake instead of locally")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Queries and bytes fetched per dashboard tab, measured against a fake Snowpark session.
+# Each tab is opened in a fresh session with empty caches, as on a cold start, so the
+# numbers are what a user pays to see that tab first.
+#
+#   python benchmarks/tab_queries.py [--studies 20] [--rows-per-study 200] [--full-tables]
+import argparse
+
+import pandas as pd
+
+from fakes import FakeSession, load_app, synthetic_tables
+
+TABS = ["Overview", "Locations", "Design", "Outcomes", "Baseline",
+        "Adverse Events", "Documents", "Limitations"]
+FULL_TABLE_TOGGLES = ["full_core", "full_locations", "full_design"]
+
+
+def measure(tables, full_tables=False):
+    """One row per tab with its query count, rows and bytes fetched, plus the
+    queries themselves."""
+    widgets = {key: True for key in FULL_TABLE_TOGGLES} if full_tables else {}
+    queries = []
+    for tab in TABS:
+        session = FakeSession(tables)
+        load_app(session, tab, widgets)
+        queries.extend(session.queries)
+    queries = pd.DataFrame(queries)
+    summary = queries.groupby("TAB", sort=False).agg(
+        QUERIES=("QUERY", "size"), ROWS=("ROWS", "sum"), BYTES=("BYTES", "sum")
+    )
+    return summary, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--studies", type=int, default=20)
+    parser.add_argument("--rows-per-study", type=int, default=200)
+    parser.add_argument("--full-tables", action="store_true",
+                        help="also open the 'Load full table' toggles")
+    parser.add_argument("--queries", action="store_true", help="list every query")
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.studies, args.rows_per_study)
+    everything = sum(int(df.memory_usage(deep=True).sum()) for df in tables.values())
+    summary, queries = measure(tables, args.full_tables)
+    summary["KB"] = (summary.pop("BYTES") / 1024).round(1)
+    print(summary.to_string())
+    print(f"\nAll {len(tables)} tables in full: {everything / 1024:.1f} KB")
+    if args.queries:
+        print()
+        for query in queries.itertuples():
+            print(f"{query.TAB:<15} {query.ROWS:>7} rows {query.BYTES:>10} B  {query.QUERY}")
+
+
+if __name__ == "__main__":
+    main()
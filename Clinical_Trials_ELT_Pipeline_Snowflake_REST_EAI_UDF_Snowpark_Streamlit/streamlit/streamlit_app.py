@@ -1,12 +1,21 @@
 # Import python packages
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
+from snowflake.snowpark.functions import col, count, lit, sum as sum_
 
+import pandas as pd
 import streamlit as st
 import plotly.express as px
 
 # ❄️ Snowflake Streamlit session
 session = get_active_session()
+script_start = time.perf_counter()
 
 st.set_page_config(page_title="Blueprint of a Clinical Trial", layout="wide")
 st.title("🧬 Blueprint of a Clinical Trial")
@@ -14,37 +23,352 @@ st.title("🧬 Blueprint of a Clinical Trial")
 # ---------------------------
 # 📥 Utility to load tables
 # ---------------------------
-@st.cache_data(show_spinner=False)
-def load_table(name):
-    return session.sql(f"SELECT * FROM {name}").to_pandas()
+# Columns rendered by each tab, so a tab only fetches what it displays.
+# Full tables are fetched on demand from the "Full ... Table" expanders.
+TAB_COLUMNS = {
+    "clinical_trial_core_normalized": [
+        "NCT_ID", "BRIEF_TITLE", "OFFICIAL_TITLE", "BRIEF_SUMMARY",
+        "DETAILED_DESCRIPTION", "CONDITIONS_SPECIFICS", "OVERALL_STATUS",
+        "START_DATE", "COMPLETION_DATE", "PRINCIPAL_INVESTIGATOR",
+        "LEAD_SPONSOR", "COLLABORATORS",
+    ],
+    "clinical_trials_locations_normalized": ["LATITUDE", "LONGITUDE"],
+    "clinical_trial_design_normalized": [
+        "STUDY_TYPE", "PHASES", "ENROLLMENT_INFO", "PRIMARY_PURPOSE",
+        "MASKING_INFO", "INTERVENTION_MODEL", "INTERVENTION_TYPE",
+        "INTERVENTION_NAME", "INTERVENTION_OTHER_NAMES",
+        "INTERVENTION_DESCRIPTION", "SEX", "MIN_AGE", "MAX_AGE",
+        "HEALTHY_VOLUNTEERS", "ELIGIBILITY_CRITERIA",
+    ],
+    "clinical_trials_limitations_normalized": ["DESCRIPTION"],
+}
+
+# Memory budget for cached tables, shared by all sessions of the app
+TABLE_CACHE_BUDGET_BYTES = 512 * 1024 * 1024
+# How often table change markers are re-read from INFORMATION_SCHEMA
+VERSION_CHECK_SECONDS = 60
+# String columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+class TableCache:
+    """LRU cache of DataFrames bounded by their in-memory size.
+
+    Each entry remembers the version of the table it was read from and is
+    reloaded as soon as the table's version changes.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+
+    def get_or_load(self, key, version, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                return entry[1]
+        df = loader()
+        size = int(df.memory_usage(deep=True).sum())
+        with self.lock:
+            stale = self.entries.pop(key, None)
+            if stale is not None:
+                self.size_bytes -= stale[2]
+            self.entries[key] = (version, df, size)
+            self.size_bytes += size
+            # Evict least recently used tables, but always keep the newest one
+            while self.size_bytes > self.budget_bytes and len(self.entries) > 1:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+        return df
+
+    def report(self):
+        with self.lock:
+            return pd.DataFrame([
+                {
+                    "TABLE": name,
+                    "NCT_ID": nct_id,
+                    "COLUMNS": len(columns) if columns else "all",
+                    "ROWS": len(df),
+                    "MB": round(size / 1024 ** 2, 3),
+                }
+                for (name, nct_id, columns), (_, df, size) in self.entries.items()
+            ])
+
+@st.cache_resource
+def get_table_cache():
+    return TableCache(TABLE_CACHE_BUDGET_BYTES)
+
+@st.cache_data(ttl=VERSION_CHECK_SECONDS, show_spinner=False)
+def load_table_versions():
+    # LAST_ALTERED moves whenever normalize_clinical_trials() rewrites a table,
+    # so a single metadata query tells which cached tables are stale
+    rows = session.sql("""
+        SELECT TABLE_NAME, LAST_ALTERED
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = CURRENT_SCHEMA()
+    """).collect()
+    return {row["TABLE_NAME"].lower(): str(row["LAST_ALTERED"]) for row in rows}
+
+def table_version(name):
+    return load_table_versions().get(name.lower())
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def query_study_ids(version):
+    return (
+        session.table("clinical_trial_core_normalized")
+        .select("NCT_ID").distinct().sort("NCT_ID")
+        .to_pandas()["NCT_ID"].tolist()
+    )
+
+def load_study_ids():
+    # The table version only keys the cache, so a rewrite refreshes the list
+    return query_study_ids(table_version("clinical_trial_core_normalized"))
+
+def compact_batch(batch):
+    # Strings become categoricals as each batch arrives, so the full table
+    # never exists with one Python string per row
+    for column in batch.select_dtypes(include=["object", "string"]).columns:
+        batch[column] = batch[column].astype("category")
+    return batch
+
+def combine_batches(batches):
+    # Categoricals only stay categoricals through concat when their categories
+    # match, so every batch is given the union of the categories first
+    for column in batches[0].select_dtypes(include="category").columns:
+        if all(isinstance(batch[column].dtype, pd.CategoricalDtype) for batch in batches):
+            categories = batches[0][column].cat.categories.append(
+                [batch[column].cat.categories for batch in batches[1:]]
+            ).unique()
+            for batch in batches:
+                batch[column] = batch[column].cat.set_categories(categories)
+    return pd.concat(batches, ignore_index=True)
+
+def compact_frame(df):
+    # Low-cardinality strings (types, organ systems, titles) stay stored once
+    # per distinct value; mostly-unique text goes back to plain strings
+    for column in df.select_dtypes(include="category").columns:
+        categories = df[column].cat.categories
+        if len(categories) > len(df) * CATEGORY_MAX_UNIQUE_RATIO:
+            df[column] = df[column].astype(categories.dtype)
+    return df
+
+def fetch_compact(df):
+    # Fetch as Arrow record batches rather than one large to_pandas() result
+    batches = [compact_batch(batch) for batch in df.to_pandas_batches()]
+    if not batches:
+        return df.to_pandas()
+    return compact_frame(combine_batches(batches))
+
+def load_table(name, nct_id, columns=None):
+    def query_table():
+        # Filter on NCT_ID in Snowflake so only the selected study's rows come back
+        df = session.table(name).filter(col("NCT_ID") == nct_id)
+        if columns:
+            df = df.select(list(columns))
+        return fetch_compact(df)
+
+    return get_table_cache().get_or_load(
+        (name, nct_id, columns), table_version(name), query_table
+    )
+
+def load_tab_table(name, nct_id):
+    return load_table(name, nct_id, tuple(TAB_COLUMNS[name]))
+
+def show_full_table(name, nct_id, key):
+    # Only pull the whole table once the user asks for it
+    if st.toggle("Load full table", key=key):
+        st.dataframe(load_table(name, nct_id))
+
+# ---------------------------
+# 📊 Utility to aggregate chart data
+# ---------------------------
+@st.cache_data(max_entries=256, show_spinner=False)
+def query_chart_data(name, version, nct_id, group_by, value_col, filters):
+    df = session.table(name).filter(col("NCT_ID") == nct_id)
+    for column, value in filters:
+        df = df.filter(col(column) == value)
+    if value_col:
+        agg = sum_(col(value_col).cast("NUMBER")).alias(value_col)
+    else:
+        agg = count(lit(1)).alias("COUNT")
+    return df.group_by(list(group_by)).agg(agg).sort(list(group_by)).to_pandas()
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def build_chart_figure(kind, name, version, nct_id, group_by, value_col, filters,
+                       title, color, labels, tickangle):
+    # Figures are memoized per study and table version, so reruns reuse them
+    data = query_chart_data(name, version, nct_id, group_by, value_col, filters)
+    if data.empty:
+        return None
+    if kind == "pie":
+        return px.pie(data, names=group_by[-1], values=value_col or "COUNT", title=title)
+    fig = px.bar(data, x=group_by[-1], y=value_col or "COUNT", color=color,
+                 title=title, labels=dict(labels))
+    if tickangle is not None:
+        fig.update_layout(xaxis_tickangle=tickangle)
+    return fig
+
+def show_chart(kind, name, nct_id, group_by, title, value_col=None, filters=(),
+               color=None, labels=(), tickangle=None):
+    # Aggregate in Snowflake and cache only the small grouped result.
+    # Without value_col rows are counted, otherwise value_col is summed.
+    fig = build_chart_figure(kind, name, table_version(name), nct_id, group_by, value_col,
+                             filters, title, color, labels, tickangle)
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=kind == "bar")
 
 # ---------------------------
-# 📦 Load Data
+# 🔍 Utility to search tables
 # ---------------------------
-core = load_table("clinical_trial_core_normalized")
-locations= load_table("clinical_trials_locations_normalized")
-design = load_table("clinical_trial_design_normalized")
-design_outcomes = load_table("clinical_trials_design_outcomes_normalized")
-baseline = load_table("clinical_trials_baseline_measures_normalized")
-outcomes = load_table("clinical_trials_outcome_measures_normalized")
-adverse = load_table("clinical_trials_adverse_events_normalized")
-limitations = load_table("clinical_trials_limitations_normalized")
-documents = load_table("clinical_trials_documents_normalized")
+# Text columns covered by the "Search Outcomes" box
+OUTCOME_SEARCH_COLUMNS = (
+    "OUTCOME_TYPE", "OUTCOME_TITLE", "OUTCOME_DESCRIPTION", "REPORTING_STATUS",
+    "TIME_FRAME", "POPULATION_DESCRIPTION", "PARAM_TYPE",
+    "PARAM_UNIT_OF_MEASURE", "CLASS_TITLE",
+)
+# Above this many rows in a study the search runs in Snowflake with ILIKE
+# instead, and the study's outcomes are never loaded whole
+SEARCH_PUSHDOWN_ROWS = 100_000
+# Matching rows returned by a search in Snowflake
+SEARCH_PUSHDOWN_LIMIT = 10_000
+# Columns of the primary and secondary outcome lists
+OUTCOME_LIST_COLUMNS = ("OUTCOME_TYPE", "OUTCOME_TITLE", "OUTCOME_DESCRIPTION", "TIME_FRAME")
+
+def tokenize(text):
+    return re.findall(r"\w+", str(text).lower())
+
+def parse_search_query(query, columns):
+    # "pain title:week" -> [("pain", None), ("week", "OUTCOME_TITLE")].
+    # A scope matches a column name with or without its table prefix.
+    scopes = {}
+    for column in columns:
+        scopes[column.lower()] = column
+        scopes.setdefault(column.lower().split("_", 1)[-1], column)
+    terms = []
+    for part in query.lower().split():
+        scope, _, term = part.rpartition(":")
+        for token in tokenize(term):
+            terms.append((token, scopes.get(scope)))
+    return terms
+
+def index_columns(df, columns):
+    # Inverted index {column: {token: [row positions]}}
+    index = {}
+    for column in columns:
+        postings = {}
+        for pos, value in enumerate(df[column].tolist()):
+            if pd.isna(value):
+                continue
+            for token in set(tokenize(value)):
+                postings.setdefault(token, []).append(pos)
+        index[column] = postings
+    return index
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def build_search_index(name, version, nct_id, columns):
+    # Built once per table version and shared read-only by all sessions, so
+    # keystrokes reuse it instead of unpickling a copy on every rerun
+    return index_columns(load_table(name, nct_id), columns)
+
+def match_rows(index, terms):
+    # Every term must match (AND); a term matches any token containing it
+    rows = None
+    for term, scope in terms:
+        term_rows = set()
+        for column in ([scope] if scope else index):
+            for token, positions in index[column].items():
+                if term in token:
+                    term_rows.update(positions)
+        rows = term_rows if rows is None else rows & term_rows
+    return sorted(rows or ())
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def query_row_count(name, version, nct_id):
+    return session.table(name).filter(col("NCT_ID") == nct_id).count()
+
+def is_search_pushed_down(name, nct_id):
+    # Decided from a count in Snowflake, before anything is loaded locally
+    return query_row_count(name, table_version(name), nct_id) > SEARCH_PUSHDOWN_ROWS
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def query_distinct_rows(name, version, nct_id, columns):
+    return fetch_compact(
+        session.table(name).filter(col("NCT_ID") == nct_id).select(list(columns)).distinct()
+    )
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def search_in_snowflake(name, version, nct_id, terms, columns):
+    # Cached per table version, study and parsed query, so reruns and repeated
+    # keystrokes do not run the search again
+    df = session.table(name).filter(col("NCT_ID") == nct_id)
+    for term, scope in terms:
+        # Terms are word tokens; an "_" only widens the match slightly
+        matches = [col(c).ilike(lit(f"%{term}%")) for c in ([scope] if scope else columns)]
+        condition = matches[0]
+        for match in matches[1:]:
+            condition = condition | match
+        df = df.filter(condition)
+    return fetch_compact(df.limit(SEARCH_PUSHDOWN_LIMIT))
+
+def search_table(name, nct_id, df, query, columns, pushdown=False):
+    # With pushdown, df is not the whole table, and even an empty query is
+    # answered in Snowflake, up to SEARCH_PUSHDOWN_LIMIT rows
+    terms = parse_search_query(query, columns)
+    if pushdown:
+        return search_in_snowflake(name, table_version(name), nct_id, tuple(terms), columns)
+    if not terms:
+        return df
+    index = build_search_index(name, table_version(name), nct_id, columns)
+    return df.iloc[match_rows(index, terms)]
+
+# ---------------------------
+# ⏱️ Utility to isolate tabs
+# ---------------------------
+def tab_fragment(render):
+    # Each tab reruns on its own when one of its widgets changes,
+    # and its render time is recorded for the timings panel
+    @st.fragment
+    @functools.wraps(render)
+    def wrapper(nct_id):
+        start = time.perf_counter()
+        render(nct_id)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        st.session_state.setdefault("render_timings", {})[render.__name__] = elapsed_ms
+        if st.session_state.get("show_timings"):
+            st.caption(f"⏱️ `{render.__name__}` rendered in {elapsed_ms:.0f} ms")
+    return wrapper
+
+# ---------------------------
+# 🔎 Study Picker
+# ---------------------------
+study_ids = load_study_ids()
+if not study_ids:
+    st.warning("No clinical trials found. Run the normalization pipeline first.")
+    st.stop()
+
+with st.sidebar:
+    nct_id = st.selectbox("Study (NCT ID)", study_ids)
 
 # ---------------------------
 # 🗂️ Tabs
 # ---------------------------
-tabs = st.tabs([
+# Only the selected tab is rendered, so data is loaded lazily per tab
+TABS = [
     "Overview", "Locations", "Design",
     "Outcomes", "Baseline", "Adverse Events",
     "Documents", "Limitations"
-])
+]
+tab = st.radio("", TABS, horizontal=True, label_visibility="collapsed")
 
 # ---------------------------
 # 🧾 OVERVIEW
 # ---------------------------
-with tabs[0]:
+@tab_fragment
+def render_overview(nct_id):
     st.header("📄 Study Overview")
+    core = load_tab_table("clinical_trial_core_normalized", nct_id)
     if not core.empty:
         with st.expander("Study Metadata", expanded=True):
             st.markdown(f"**Study Identifier:** {core['NCT_ID'][0]}")
@@ -65,24 +389,28 @@ with tabs[0]:
             st.markdown(f"**Lead Sponsor:** {core['LEAD_SPONSOR'][0]}")
             st.markdown(f"**Collaborators:** {core['COLLABORATORS'][0]}")
         with st.expander("Full Study Table", expanded=True):
-            st.dataframe(core)
+            show_full_table("clinical_trial_core_normalized", nct_id, "full_core")
 
 # ---------------------------
 # 📍 LOCATIONS
 # ---------------------------
-with tabs[1]:
+@tab_fragment
+def render_locations(nct_id):
     st.header("📍 Trial Locations")
+    locations = load_tab_table("clinical_trials_locations_normalized", nct_id)
     if {"LATITUDE", "LONGITUDE"}.issubset(locations.columns):
         st.map(locations[['LATITUDE', 'LONGITUDE']].dropna())
 
     with st.expander("Full Location Table", expanded=True):
-        st.dataframe(locations)
+        show_full_table("clinical_trials_locations_normalized", nct_id, "full_locations")
 
 # ---------------------------
 # 🧬 DESIGN
 # ---------------------------
-with tabs[2]:
+@tab_fragment
+def render_design(nct_id):
     st.header("🧬 Study Design")
+    design = load_tab_table("clinical_trial_design_normalized", nct_id)
     if not design.empty:
         with st.expander("Design Metadata", expanded=True):
             st.markdown(f"**Study Type:** {design['STUDY_TYPE'][0]}")
@@ -105,14 +433,23 @@ with tabs[2]:
             st.markdown("**Eligibility Criteria:**")
             st.text_area("", design['ELIGIBILITY_CRITERIA'][0], height=200)
         with st.expander("Full Design Table", expanded=True):
-            st.dataframe(design)
+            show_full_table("clinical_trial_design_normalized", nct_id, "full_design")
  
 
 # ---------------------------
 # 🎯 OUTCOMES
 # ---------------------------
-with tabs[3]:
+@tab_fragment
+def render_outcomes(nct_id):
     st.header("🎯 Outcome Measures")
+    name = "clinical_trials_outcome_measures_normalized"
+    pushdown = is_search_pushed_down(name, nct_id)
+    if pushdown:
+        # Too large to load: only the distinct outcomes are listed, and the
+        # table shows search results from Snowflake
+        outcomes = query_distinct_rows(name, table_version(name), nct_id, OUTCOME_LIST_COLUMNS)
+    else:
+        outcomes = load_table(name, nct_id)
 
     # Filter
     primary_df = outcomes[outcomes["OUTCOME_TYPE"] == "PRIMARY"]
@@ -141,85 +478,47 @@ with tabs[3]:
             st.markdown(secondary_text)
 
     with st.expander("Statistics", expanded=True):
-        if "OUTCOME_TYPE" in outcomes.columns:
-            om_plot = outcomes.groupby("OUTCOME_TYPE").size().reset_index(name="count")
-            fig_om = px.pie(om_plot, names="OUTCOME_TYPE", 
-                            values="count", 
-                            title="Outcome Measures Breakdown by Type")
-            st.plotly_chart(fig_om)
-
-        if "OUTCOME_TITLE" in outcomes.columns:
-            om_plot = outcomes.groupby("OUTCOME_TITLE").size().reset_index(name="count")
-            fig_om = px.pie(om_plot, names="OUTCOME_TITLE", 
-                            values="count", 
-                            title="Outcome Measures Breakdown by Title")
-            st.plotly_chart(fig_om)
-
-        if "CLASS_TITLE" in outcomes.columns and "MEASUREMENT_VALUE" in outcomes.columns and "OUTCOME_TITLE" in outcomes.columns:
-            # Group by TYPE and CLASS, and sum participants
-            chart_data = (
-                outcomes.groupby(["OUTCOME_TITLE", "CLASS_TITLE"])["MEASUREMENT_VALUE"]
-                .sum()
-                .reset_index()
-            )
-
-            fig = px.bar(
-                chart_data,
-                x="CLASS_TITLE",
-                y="MEASUREMENT_VALUE",
-                color="OUTCOME_TITLE",
-                title= "Outcomes by Type and Class",
-                labels={"CLASS_TITLE":"CLASS", "OUTCOME_TITLE":"OUTCOME", "MEASUREMENT_VALUE": "PARTICIPANTS"},
-            )
-
-            fig.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig, use_container_width=True)        
+        show_chart("pie", "clinical_trials_outcome_measures_normalized", nct_id, ("OUTCOME_TYPE",),
+                   "Outcome Measures Breakdown by Type")
+        show_chart("pie", "clinical_trials_outcome_measures_normalized", nct_id, ("OUTCOME_TITLE",),
+                   "Outcome Measures Breakdown by Title")
+        # Group by TYPE and CLASS, and sum participants
+        show_chart("bar", "clinical_trials_outcome_measures_normalized", nct_id, ("OUTCOME_TITLE", "CLASS_TITLE"),
+                   "Outcomes by Type and Class", value_col="MEASUREMENT_VALUE",
+                   color="OUTCOME_TITLE",
+                   labels=(("CLASS_TITLE", "CLASS"), ("OUTCOME_TITLE", "OUTCOME"),
+                           ("MEASUREMENT_VALUE", "PARTICIPANTS")),
+                   tickangle=-45)
 
     with st.expander("Search Outcomes", expanded=True):
-        search = st.text_input("")
-        filtered_outcomes = outcomes[outcomes.apply(lambda row: search.lower() in row.astype(str).str.lower().to_string(), axis=1)] if search else outcomes
+        search = st.text_input("", help="All terms must match. Prefix a term with a column to scope it, e.g. title:pain")
+        filtered_outcomes = search_table(name, nct_id, outcomes, search,
+                                         OUTCOME_SEARCH_COLUMNS, pushdown)
 
     with st.expander("Outcome Measures Table", expanded=True):
+        if pushdown and len(filtered_outcomes) == SEARCH_PUSHDOWN_LIMIT:
+            st.caption(f"Showing the first {SEARCH_PUSHDOWN_LIMIT:,} matching rows; "
+                       "refine the search to see the rest")
         st.dataframe(filtered_outcomes)
 
 # ---------------------------
 # 👤 BASELINE CHARACTERISTICS
 # ---------------------------
-with tabs[4]:
+@tab_fragment
+def render_baseline(nct_id):
     st.header("👤 Baseline Characteristics")
+    baseline = load_table("clinical_trials_baseline_measures_normalized", nct_id)
 
     with st.expander("Statistics", expanded=True):
-        if "PARAM_TITLE" in baseline.columns:
-            chart_data = baseline.groupby("PARAM_TITLE").size().reset_index(name="count")
-            fig = px.bar(chart_data, x="PARAM_TITLE", y="count",
-                         title="Baseline Measures per Type",
-                         labels={"PARAM_TITLE":"MEASURE"},
-
-                        )
-            st.plotly_chart(fig, use_container_width=True) 
-
-        if "CATEGORY_TITLE" in baseline.columns and "VALUE" in baseline.columns and "PARAM_TITLE" in baseline.columns:
-            
-            # Filter only Race data first
-            race_df = baseline[baseline["PARAM_TITLE"] == "Race (NIH/OMB)"]
-    
-            # Group by TYPE and CATEGORY, and sum participants
-            chart_data = (
-                race_df.groupby(["PARAM_TITLE", "CATEGORY_TITLE"])["VALUE"]
-                .sum()
-                .reset_index()
-            )
-
-            fig = px.bar(
-                chart_data,
-                x="CATEGORY_TITLE",
-                y="VALUE",
-                title= "Baseline Measurements by Race",
-                labels={"CATEGORY_TITLE":"RACE", "VALUE": "PARTICIPANTS"},
-            )
-
-            fig.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig, use_container_width=True)
+        show_chart("bar", "clinical_trials_baseline_measures_normalized", nct_id, ("PARAM_TITLE",),
+                   "Baseline Measures per Type",
+                   labels=(("PARAM_TITLE", "MEASURE"), ("COUNT", "count")))
+        # Filter only Race data, group by TYPE and CATEGORY, and sum participants
+        show_chart("bar", "clinical_trials_baseline_measures_normalized", nct_id, ("PARAM_TITLE", "CATEGORY_TITLE"),
+                   "Baseline Measurements by Race", value_col="VALUE",
+                   filters=(("PARAM_TITLE", "Race (NIH/OMB)"),),
+                   labels=(("CATEGORY_TITLE", "RACE"), ("VALUE", "PARTICIPANTS")),
+                   tickangle=-45)
     
     with st.expander("Baseline Measures Table", expanded=True):
         st.dataframe(baseline)
@@ -228,46 +527,29 @@ with tabs[4]:
 # ---------------------------
 # ⚠️ ADVERSE EVENTS
 # ---------------------------
-with tabs[5]:
+@tab_fragment
+def render_adverse_events(nct_id):
     st.header("⚠️ Adverse Events")
+    adverse = load_table("clinical_trials_adverse_events_normalized", nct_id)
 
     with st.expander("Metadata", expanded=True):
+        if not adverse.empty:
             st.markdown("**Description:**")
             st.text_area("", adverse['ADVERSE_EVENT_DESCRIPTION'][0])
             st.markdown(f"**Time Frame:** {adverse['TIME_FRAME'][0]}")
             st.markdown(f"**Frequency:** {adverse['FREQUENCY_THRESHOLD'][0]}")
    
     with st.expander("Statistics", expanded=True):
-        if "ADVERSE_EVENT_TYPE" in adverse.columns:
-            ae_plot = adverse.groupby("ADVERSE_EVENT_TYPE").size().reset_index(name="count")
-            fig_ae = px.pie(ae_plot, names="ADVERSE_EVENT_TYPE", values="count", title="Adverse Events Breakdown by Type")
-            st.plotly_chart(fig_ae)
-
-        if "ORGAN_SYSTEM" in adverse.columns:
-            ae_plot = adverse.groupby("ORGAN_SYSTEM").size().reset_index(name="count")
-            fig_ae = px.pie(ae_plot, names="ORGAN_SYSTEM", values="count", title="Adverse Events Breakdown by Organ System")
-            st.plotly_chart(fig_ae)
-
-
-        if "TERM" in adverse.columns and "AFFECTED_PARTICIPANTS" in adverse.columns and "ADVERSE_EVENT_TYPE" in adverse.columns:
-            # Group by TYPE and TERM, and sum affected participants
-            chart_data = (
-                adverse.groupby(["ADVERSE_EVENT_TYPE", "TERM"])["AFFECTED_PARTICIPANTS"]
-                .sum()
-                .reset_index()
-            )
-
-            fig = px.bar(
-                chart_data,
-                x="TERM",
-                y="AFFECTED_PARTICIPANTS",
-                color="ADVERSE_EVENT_TYPE",
-                title= "Affected Participants by Type and Term",
-                labels={"AFFECTED_PARTICIPANTS": "PARTICIPANTS AFFECTED"},
-            )
-
-            fig.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig, use_container_width=True)
+        show_chart("pie", "clinical_trials_adverse_events_normalized", nct_id, ("ADVERSE_EVENT_TYPE",),
+                   "Adverse Events Breakdown by Type")
+        show_chart("pie", "clinical_trials_adverse_events_normalized", nct_id, ("ORGAN_SYSTEM",),
+                   "Adverse Events Breakdown by Organ System")
+        # Group by TYPE and TERM, and sum affected participants
+        show_chart("bar", "clinical_trials_adverse_events_normalized", nct_id, ("ADVERSE_EVENT_TYPE", "TERM"),
+                   "Affected Participants by Type and Term",
+                   value_col="AFFECTED_PARTICIPANTS", color="ADVERSE_EVENT_TYPE",
+                   labels=(("AFFECTED_PARTICIPANTS", "PARTICIPANTS AFFECTED"),),
+                   tickangle=-45)
     
     with st.expander("Filter by Event Type", expanded=True):
         filter_type = st.selectbox("", options=["All"] + sorted(adverse["ADVERSE_EVENT_TYPE"].dropna().unique().tolist()))
@@ -279,19 +561,54 @@ with tabs[5]:
 # ---------------------------
 # 📄 DOCUMENTS
 # ---------------------------
-with tabs[6]:
+@tab_fragment
+def render_documents(nct_id):
     st.header("📄 Trial Documents")
+    documents = load_table("clinical_trials_documents_normalized", nct_id)
     with st.expander("Documents Table", expanded=True):
         st.dataframe(documents)
 
 # ---------------------------
 # 🔍 Limitations
 # ---------------------------
-with tabs[7]:  
+@tab_fragment
+def render_limitations(nct_id):
     st.header("📝 Limitations & Caveats")
+    limitations = load_tab_table("clinical_trials_limitations_normalized", nct_id)
 
     with st.expander("Limitations of study", expanded=True):
-        st.markdown("**Description:**")
-        st.text_area("", limitations['DESCRIPTION'][0], height=200)
+        if not limitations.empty:
+            st.markdown("**Description:**")
+            st.text_area("", limitations['DESCRIPTION'][0], height=200)
 
+# ---------------------------
+# 🗂️ Render Selected Tab
+# ---------------------------
+TAB_RENDERERS = {
+    "Overview": render_overview,
+    "Locations": render_locations,
+    "Design": render_design,
+    "Outcomes": render_outcomes,
+    "Baseline": render_baseline,
+    "Adverse Events": render_adverse_events,
+    "Documents": render_documents,
+    "Limitations": render_limitations,
+}
+TAB_RENDERERS[tab](nct_id)
 
+# ---------------------------
+# 🧠 Memory Report
+# ---------------------------
+# Rendered last so it includes the tables loaded by the selected tab
+with st.sidebar:
+    with st.expander("Memory Report"):
+        memory = get_table_cache().report()
+        used_mb = memory["MB"].sum() if not memory.empty else 0
+        st.caption(f"{used_mb:.1f} MB of {TABLE_CACHE_BUDGET_BYTES / 1024 ** 2:.0f} MB cache budget")
+        st.dataframe(memory, hide_index=True)
+
+    # Full-script reruns are timed here; tab-only reruns are timed per fragment
+    st.toggle("Show render timings", key="show_timings")
+    if st.session_state.show_timings:
+        st.caption(f"Full rerun: {(time.perf_counter() - script_start) * 1000:.0f} ms")
+        st.json(st.session_state.get("render_timings", {}))
@@ -0,0 +1,143 @@
+# Stand-ins for the Streamlit in Snowflake runtime, so that the chat app's functions
+# can run offline against a stub Analyst endpoint (see stub_analyst.py).
+# load_app() registers fake streamlit, _snowflake and snowpark modules and imports
+# streamlit/streamlit_app.py without running main().
+import importlib.util
+import os
+import sys
+import time
+import types
+import uuid
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "streamlit", "streamlit_app.py")
+SEMANTIC_MODEL_PATH = "HL7_FHIR.HARMONIZED.CORTEX_ANALYST_STAGE/hl7_fhir_r4_semantic_model.yaml"
+
+
+class SessionState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class Placeholder:
+    """A st.empty() placeholder that records when it is first drawn into."""
+
+    def __init__(self, renders):
+        self.renders = renders
+
+    def __getattr__(self, name):
+        def render(*args, **kwargs):
+            self.renders.append((time.perf_counter(), name))
+        return render
+
+
+class FakeJob:
+    def __init__(self, session, query):
+        self.query = query
+        self.query_id = uuid.uuid4().hex
+        session.started.append((time.perf_counter(), query))
+
+    def is_done(self):
+        return True
+
+    def result(self, result_type=None):
+        return None
+
+
+class FakeQuery:
+    def __init__(self, session, query):
+        self.session = session
+        self.query = query
+
+    def collect_nowait(self, statement_params=None):
+        return FakeJob(self.session, self.query)
+
+    def collect(self):
+        return []
+
+
+class FakeSession:
+    """Records when each query is started; queries return no rows."""
+
+    def __init__(self):
+        self.started = []
+        self.query_tag = None
+
+    def sql(self, query, params=None):
+        return FakeQuery(self, query)
+
+    def get_current_role(self):
+        return "ANALYST"
+
+
+def cache(func=None, **_options):
+    def decorate(func):
+        memo = {}
+
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            if key not in memo:
+                memo[key] = func(*args, **kwargs)
+            return memo[key]
+
+        wrapper.clear = memo.clear
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+def fake_streamlit():
+    st = types.ModuleType("streamlit")
+    st.session_state = SessionState()
+    st.renders = []  # (time, element) drawn into placeholders
+    st.cache_data = cache
+    st.cache_resource = cache
+    st.fragment = lambda func: func
+    st.empty = lambda: Placeholder(st.renders)
+    st.__getattr__ = lambda name: (lambda *args, **kwargs: Placeholder(st.renders))
+    return st
+
+
+def load_app(transport, session=None, **state):
+    """
+    Import the app with `transport` as its Analyst transport and return the module.
+    Session state starts as after reset_session_state(), updated with `state`.
+    """
+    session = session or FakeSession()
+    st = fake_streamlit()
+    snowflake_api = types.ModuleType("_snowflake")
+    snowflake_api.send_snow_api_request = transport
+    context = types.ModuleType("snowflake.snowpark.context")
+    context.get_active_session = lambda: session
+    exceptions = types.ModuleType("snowflake.snowpark.exceptions")
+    exceptions.SnowparkSQLException = type("SnowparkSQLException", (Exception,), {})
+    errors = types.ModuleType("snowflake.connector.errors")
+    errors.DatabaseError = type("DatabaseError", (Exception,), {})
+    sys.modules.update({
+        "streamlit": st,
+        "_snowflake": snowflake_api,
+        "snowflake": types.ModuleType("snowflake"),
+        "snowflake.snowpark": types.ModuleType("snowflake.snowpark"),
+        "snowflake.snowpark.context": context,
+        "snowflake.snowpark.exceptions": exceptions,
+        "snowflake.connector": types.ModuleType("snowflake.connector"),
+        "snowflake.connector.errors": errors,
+    })
+    spec = importlib.util.spec_from_file_location("streamlit_app", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    st.session_state.selected_semantic_model_path = SEMANTIC_MODEL_PATH
+    st.session_state.stream_responses = True
+    st.session_state.history_window = app.HISTORY_WINDOW_TURNS
+    st.session_state.use_answer_cache = False
+    st.session_state.prefetch = False
+    st.session_state.max_result_rows = app.MAX_RESULT_ROWS
+    app.reset_session_state()
+    st.session_state.update(state)
+    app.session = session
+    return app
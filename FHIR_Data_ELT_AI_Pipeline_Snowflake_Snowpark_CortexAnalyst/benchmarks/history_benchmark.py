@@ -0,0 +1,132 @@
+# Request size and latency over a recorded 50-turn conversation against the stub
+# Analyst, sending the full history as the app used to and the compacted history
+# it sends now. Checks first that compacted histories always alternate between user
+# and analyst messages, as the Analyst API requires.
+#
+#   python benchmarks/history_benchmark.py [--turns 50] [--window 3] [--record turns.jsonl]
+import argparse
+import json
+import random
+import time
+
+from fakes import load_app
+from stub_analyst import StubAnalyst
+
+QUESTIONS = [
+    "How many patients are there by gender?",
+    "Which conditions are most common among them?",
+    "Break that down by year of onset",
+    "How many encounters did those patients have?",
+    "What is the average length of stay?",
+    "Only for inpatient encounters",
+    "Which medications were prescribed most often?",
+    "Show the trend by month",
+]
+# Per-request model of the endpoint: fixed latency, then a cost per KB of prompt
+FIRST_EVENT_S = 0.05
+EVENT_S = 0.001
+PER_KB_S = 0.01
+
+
+def user(text):
+    return {"role": "user", "content": [{"type": "text", "text": text}]}
+
+
+def check_alternation(app, turns=50, seed=0):
+    """Compact random conversations with failed, unanswered and similar-offered
+    questions at every window size, and check that each result alternates
+    user/analyst messages and never includes a similar-question offer."""
+    rng = random.Random(seed)
+    stub = StubAnalyst()
+    messages = []
+    for turn in range(turns):
+        messages.append(user(rng.choice(QUESTIONS)))
+        for window in range(1, 11):
+            compacted = app.compact_history(messages, window)
+            roles = [message["role"] for message in compacted]
+            assert roles[0] == "user" and roles[-1] == "user", roles
+            assert all(a != b for a, b in zip(roles, roles[1:])), roles
+            # With a window of one turn, earlier questions are prepended to the new one
+            assert compacted[-1]["content"][0]["text"].endswith(messages[-1]["content"][0]["text"])
+            for message in compacted:
+                assert all(item["type"] != "suggestions" for item in message["content"])
+                assert "similar_question" not in message
+                if message["role"] == "user":
+                    assert [item["type"] for item in message["content"]] == ["text"]
+        outcome = rng.random()
+        if outcome < 0.1:
+            continue  # unanswered: the app stopped before the answer was added
+        if outcome < 0.2:
+            messages.append({"role": "analyst", "content": [{"type": "text", "text": "🚨 error"}],
+                             "request_id": None})
+            continue
+        if outcome < 0.3:
+            # Offered a cached similar question instead of an answer
+            question = messages[-1]["content"][0]["text"]
+            messages.append({"role": "analyst", "content": [{"type": "text", "text": "similar"}],
+                             "similar_question": rng.choice(QUESTIONS), "question": question})
+        else:
+            response = stub.response(messages[-1]["content"][0]["text"], f"request-{turn}")
+            messages.append({"role": "analyst", "content": response["message"]["content"],
+                             "request_id": response["request_id"], "cached": False})
+
+
+def run(turns, window, record):
+    stub = StubAnalyst(FIRST_EVENT_S, EVENT_S, PER_KB_S)
+    app = load_app(stub, history_window=window)
+    check_alternation(app)
+    rows = []
+    for turn in range(turns):
+        app.st.session_state.messages.append(user(QUESTIONS[turn % len(QUESTIONS)]))
+        messages = app.st.session_state.messages
+
+        # Full history, as sent before compaction
+        full_body = {"messages": messages, "semantic_model_file": f"@{app.st.session_state.selected_semantic_model_path}"}
+        start = time.perf_counter()
+        stub(*full_request(full_body))
+        full_s = time.perf_counter() - start
+        full_bytes = stub.requests[-1][1]
+
+        start = time.perf_counter()
+        response, error = app.get_analyst_response(messages)
+        sent_s = time.perf_counter() - start
+        assert error is None, error
+        sent_bytes = stub.requests[-1][1]
+        messages.append({"role": "analyst", "content": response["message"]["content"],
+                         "request_id": response["request_id"], "cached": False})
+        rows.append({"turn": turn + 1, "window": window, "full_bytes": full_bytes,
+                     "sent_bytes": sent_bytes, "full_ms": round(full_s * 1000, 1),
+                     "sent_ms": round(sent_s * 1000, 1)})
+    if record:
+        with open(record, "w") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+    return rows
+
+
+def full_request(body):
+    return "POST", "/api/v2/cortex/analyst/message", {}, {}, body, None, 50000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--window", type=int, default=None, help="history window (default: the app's)")
+    parser.add_argument("--record", help="write one JSON line per turn to this file")
+    args = parser.parse_args()
+
+    window = args.window or load_app(StubAnalyst()).HISTORY_WINDOW_TURNS
+    rows = run(args.turns, window, args.record)
+    print("alternation: ok")
+    print(f"window: {window} turns; stub: {FIRST_EVENT_S * 1000:.0f} ms + {PER_KB_S * 1000:.0f} ms/KB sent")
+    print(f"{'turn':>4} {'full KB':>8} {'sent KB':>8} {'full ms':>8} {'sent ms':>8}")
+    for row in rows:
+        if row["turn"] in (1, 5) or row["turn"] % 10 == 0:
+            print(f"{row['turn']:>4} {row['full_bytes'] / 1024:>8.1f} {row['sent_bytes'] / 1024:>8.1f} "
+                  f"{row['full_ms']:>8.0f} {row['sent_ms']:>8.0f}")
+    full = sum(row["full_bytes"] for row in rows)
+    sent = sum(row["sent_bytes"] for row in rows)
+    print(f"total: {full / 1024:,.0f} KB full, {sent / 1024:,.0f} KB sent ({sent / full:.0%})")
+
+
+if __name__ == "__main__":
+    main()
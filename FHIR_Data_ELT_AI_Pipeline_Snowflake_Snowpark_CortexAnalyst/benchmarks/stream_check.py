@@ -0,0 +1,46 @@
+# Time to first rendered token and to SQL start for streamed Analyst responses,
+# with a transport that streams lines and with one that returns the body only once
+# complete (as `_snowflake.send_snow_api_request` does).
+#
+#   python benchmarks/stream_check.py [--first-event 0.5] [--event 0.05]
+import argparse
+import time
+
+from fakes import FakeSession, load_app
+from stub_analyst import StubAnalyst
+
+QUESTION = [{"role": "user", "content": [{"type": "text", "text": "How many patients by gender?"}]}]
+
+
+def measure(streams, first_event_s, event_s):
+    """Seconds to the first rendered token, to the SQL start and to the full response."""
+    session = FakeSession()
+    app = load_app(StubAnalyst(first_event_s, event_s, streams=streams), session)
+    start = time.perf_counter()
+    response, error = app.stream_analyst_response(QUESTION)
+    total = time.perf_counter() - start
+    assert error is None, error
+    assert [item["type"] for item in response["message"]["content"]] == ["text", "sql", "suggestions"]
+    first_render = min(t for t, _ in app.st.renders) - start
+    sql_start = session.started[0][0] - start
+    return first_render, sql_start, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--first-event", type=float, default=0.5, help="seconds before the first event")
+    parser.add_argument("--event", type=float, default=0.05, help="seconds between events")
+    args = parser.parse_args()
+
+    print(f"{'transport':<10} {'first token':>12} {'SQL start':>10} {'response':>9}")
+    for streams in (True, False):
+        first_render, sql_start, total = measure(streams, args.first_event, args.event)
+        name = "streams" if streams else "buffers"
+        print(f"{name:<10} {first_render:>11.2f}s {sql_start:>9.2f}s {total:>8.2f}s")
+        if streams:
+            # The incremental path must render and start SQL before the response ends
+            assert first_render < total / 2 and sql_start < total, "streaming path did not stream"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Local stand-in for the Cortex Analyst message endpoint, with the call signature of
+# `_snowflake.send_snow_api_request`, to use as the app's ANALYST_TRANSPORT offline.
+# Answers take a fixed time to start plus a delay per generated event, as a model does.
+import json
+import time
+import uuid
+
+ANSWER_TEXT = "This is our interpretation of your question: {question}"
+ANSWER_SQL = (
+    "SELECT GENDER, COUNT(DISTINCT PATIENT_ID) AS PATIENT_COUNT\n"
+    "FROM HL7_FHIR.HARMONIZED.PATIENT\n"
+    "GROUP BY GENDER\n"
+    "ORDER BY PATIENT_COUNT DESC"
+)
+SUGGESTIONS = [
+    "How many encounters did each patient have?",
+    "What are the most common conditions?",
+    "How many patients were admitted last year?",
+]
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StubAnalyst:
+    """
+    Callable transport answering every question with text, SQL and suggestions.
+
+    `first_event_s` passes before the first event, and `event_s` between events,
+    plus `per_kb_s` per KB of request body to model prompt processing. With
+    `streams=False` a streamed response is returned only once fully generated,
+    as `_snowflake.send_snow_api_request` does; with `streams=True` its content is
+    an iterator of lines that arrive as they are generated.
+    """
+
+    def __init__(self, first_event_s=0.5, event_s=0.05, per_kb_s=0.0, streams=True):
+        self.first_event_s = first_event_s
+        self.event_s = event_s
+        self.per_kb_s = per_kb_s
+        self.streams = streams
+        self.requests = []  # (request body, bytes)
+
+    def __call__(self, method, path, headers, params, body, request_guid, timeout):
+        size = len(json.dumps(body))
+        self.requests.append((body, size))
+        question = body["messages"][-1]["content"][0]["text"]
+        request_id = uuid.uuid4().hex
+        setup_s = self.first_event_s + self.per_kb_s * size / 1024
+        if not body.get("stream"):
+            events = self.events(question, request_id)
+            time.sleep(setup_s + self.event_s * len(events))
+            return {"status": 200, "content": json.dumps(self.response(question, request_id))}
+        lines = self.lines(question, request_id, setup_s)
+        if self.streams:
+            return {"status": 200, "content": lines}
+        return {"status": 200, "content": "".join(lines)}
+
+    def response(self, question, request_id):
+        return {
+            "request_id": request_id,
+            "message": {
+                "role": "analyst",
+                "content": [
+                    {"type": "text", "text": ANSWER_TEXT.format(question=question)},
+                    {"type": "sql", "statement": ANSWER_SQL, "confidence": {"verified_query_used": None}},
+                    {"type": "suggestions", "suggestions": SUGGESTIONS},
+                ],
+            },
+        }
+
+    def events(self, question, request_id):
+        text = ANSWER_TEXT.format(question=question)
+        events = [("status", {"status": "interpreting_question", "status_message": "Interpreting question"})]
+        events += [
+            ("message.content.delta", {"index": 0, "type": "text", "text_delta": word + " "})
+            for word in text.split()
+        ]
+        events += [
+            ("message.content.delta", {"index": 1, "type": "sql", "statement_delta": line + "\n",
+                                       "confidence": {"verified_query_used": None}})
+            for line in ANSWER_SQL.splitlines()
+        ]
+        events += [
+            ("message.content.delta", {"index": 2, "type": "suggestions",
+                                       "suggestions_delta": {"index": i, "suggestion_delta": suggestion}})
+            for i, suggestion in enumerate(SUGGESTIONS)
+        ]
+        events += [("response_metadata", {"request_id": request_id}), ("done", {})]
+        return events
+
+    def lines(self, question, request_id, setup_s):
+        """Lines of the SSE body, generated with the model's delays."""
+        time.sleep(setup_s)
+        for event, data in self.events(question, request_id):
+            time.sleep(self.event_s)
+            yield from sse_event(event, data).splitlines(keepends=True)
@@ -4,16 +4,30 @@ Cortex Analyst Conversational App
 This app allows users to interact with HL7 FHIR structured data using natural language question asking.
 """
 import json  # To handle JSON data
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
 import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 import _snowflake  # For interacting with Snowflake-specific APIs
+import numpy as np
 import pandas as pd
 import streamlit as st  # Streamlit library for building the web app
+import yaml
 from snowflake.snowpark.context import (
     get_active_session,
 )  # To interact with Snowflake sessions
+from snowflake.connector.errors import DatabaseError
 from snowflake.snowpark.exceptions import SnowparkSQLException
 
 # List of available semantic model paths in the format: <DATABASE>.<SCHEMA>.<STAGE>/<FILE-NAME>
@@ -24,11 +38,57 @@ AVAILABLE_SEMANTIC_MODELS_PATHS = [
 API_ENDPOINT = "/api/v2/cortex/analyst/message"
 FEEDBACK_API_ENDPOINT = "/api/v2/cortex/analyst/feedback"
 API_TIMEOUT = 50000  # in milliseconds
+RESULT_STORE_MAX_ENTRIES = 50  # SQL results kept per session
+RESULT_SPILL_BYTES = 50 * 1024 * 1024  # results larger than this are kept on disk
+QUERY_CACHE_TTL = 15 * 60  # in seconds
+QUERY_CACHE_BUDGET_BYTES = 512 * 1024 * 1024  # shared by all users of the app
+RESULT_PAGE_SIZE = 1_000  # rows fetched per page of results
+HISTORY_WINDOW_TURNS = 3  # latest question/answer turns sent to the Analyst in full
+HISTORY_MAX_EARLIER_QUESTIONS = 10  # older questions summarized ahead of the window
+ANSWER_CACHE_PATH = os.path.join(tempfile.gettempdir(), "analyst_answer_cache.sqlite")
+ANSWER_CACHE_SIMILARITY = 0.8  # token overlap at which a cached question is offered as similar
+SEMANTIC_MODEL_VERSION_TTL = 60  # in seconds
+TRACE_MAX_SPANS = 200  # spans kept for the latency panel per question
+TRACE_METRICS_PATH = os.path.join(tempfile.gettempdir(), "analyst_metrics.jsonl")
+TRACE_METRICS_MAX_BYTES = 5 * 1024 * 1024  # then the file is rotated to TRACE_METRICS_PATH.1
+TRACE_SUMMARY_TTL = 60  # in seconds
+QUERY_TAG_APP = "cortex_analyst_healthcare"  # app name in the QUERY_TAG of every query
+PREFETCH_MAX_WORKERS = 4  # questions prefetched concurrently, shared by all sessions
+PREFETCH_BUDGET = 12  # questions prefetched at most per session
+PREFETCH_SQL_TIMEOUT = 60  # in seconds, per prefetched SQL statement
+PREFETCH_THREAD_PREFIX = "analyst_prefetch"
+MAX_RESULT_ROWS = 20_000  # default row cap: larger results are truncated in the table and
+# aggregated in Snowflake before charting
+MAX_RESULT_ROWS_LIMIT = 200_000  # highest row cap that can be set in the sidebar
+CHART_MAX_POINTS = 1_000  # points drawn at most per line chart
+CHART_TOP_N = 20  # bars drawn before the rest are grouped into "Other"
+
+# Callable with the signature of `_snowflake.send_snow_api_request`, used for all
+# Analyst API calls. Replace it with a local stand-in to run the app against a stub endpoint.
+ANALYST_TRANSPORT = _snowflake.send_snow_api_request
+# Whether the transport streams: `_snowflake.send_snow_api_request` returns a streamed
+# response only once it is complete, so its events are replayed after the full round
+# trip. A transport whose response content is an iterable of lines streams them as
+# they arrive, and then text shows and SQL starts before the response ends.
+ANALYST_TRANSPORT_STREAMS = False
+
+# Errors of a failed query: Snowpark raises SnowparkSQLException, while async query
+# jobs raise the connector's ProgrammingError or other DatabaseError subclasses
+QUERY_ERRORS = (SnowparkSQLException, DatabaseError)
 
 # Initialize a Snowpark session for executing queries
 session = get_active_session()
 
 
+class QueryResult(NamedTuple):
+    """A query executed once in Snowflake whose rows are read back page by page."""
+
+    query_id: Optional[str]
+    row_count: int
+    first_page: Optional[pd.DataFrame]
+    err_msg: Optional[str]
+
+
 def main():
     # Initialize session state
     if "messages" not in st.session_state:
@@ -40,6 +100,8 @@ def main():
     handle_user_inputs()
     handle_error_notifications()
     display_warnings()
+    with st.sidebar:
+        display_latency_panel()
 
 
 def reset_session_state():
@@ -50,6 +112,15 @@ def reset_session_state():
     st.session_state.form_submitted = (
         {}
     )  # Dictionary to store feedback submission for each request
+    if "result_store" in st.session_state:
+        st.session_state.result_store.close()
+    st.session_state.result_store = ResultStore(
+        RESULT_STORE_MAX_ENTRIES, RESULT_SPILL_BYTES
+    )  # SQL results of analyst messages, computed once per message
+    st.session_state.pending_queries = {}  # SQL started while a response streams in
+    st.session_state.request_sizes = []  # (bytes sent, bytes of full history) per request
+    st.session_state.prefetches = {}  # answer cache key -> background prefetch
+    st.session_state.prefetch_budget = PREFETCH_BUDGET
 
 
 def show_header_and_sidebar():
@@ -69,6 +140,54 @@ def show_header_and_sidebar():
             key="selected_semantic_model_path",
             on_change=reset_session_state,
         )
+        st.toggle(
+            "Stream responses",
+            value=ANALYST_TRANSPORT_STREAMS,
+            key="stream_responses",
+            help="Show the Analyst's answer and SQL as they are generated"
+            if ANALYST_TRANSPORT_STREAMS
+            else "The Analyst's answer is received in full before it is shown, so "
+            "streaming only replays it; it does not shorten the wait",
+        )
+        st.slider(
+            "History window (turns)",
+            min_value=1,
+            max_value=10,
+            value=HISTORY_WINDOW_TURNS,
+            key="history_window",
+            help="Question/answer turns sent to the Analyst in full; "
+            "only the questions of older turns are sent",
+        )
+        st.toggle(
+            "Use answer cache",
+            value=True,
+            key="use_answer_cache",
+            help="Answer questions asked before against the same semantic model "
+            "without calling the Analyst",
+        )
+        display_answer_cache_stats()
+        # Prefetched answers are only ever read back from the answer cache
+        st.toggle(
+            "Prefetch suggestions",
+            value=False,
+            key="prefetch",
+            disabled=not st.session_state.use_answer_cache,
+            help="Answer suggested and verified questions in the background, "
+            f"up to {PREFETCH_BUDGET} per conversation, so clicking them is instant"
+            if st.session_state.use_answer_cache
+            else "Prefetching needs the answer cache, which is turned off",
+        )
+        st.number_input(
+            "Result row cap",
+            min_value=RESULT_PAGE_SIZE,
+            max_value=MAX_RESULT_ROWS_LIMIT,
+            value=MAX_RESULT_ROWS,
+            step=RESULT_PAGE_SIZE,
+            key="max_result_rows",
+            help="Rows of a result shown in its table and charted as they are; "
+            "larger results are truncated in the table and aggregated for charts",
+        )
+        display_request_sizes()
         st.divider()
         # Center this button
         _, btn_container, _ = st.columns([2, 6, 2])
@@ -76,6 +195,29 @@ def show_header_and_sidebar():
             reset_session_state()
 
 
+def display_request_sizes():
+    """Display the size of each Analyst request next to the full history it replaced."""
+    sizes = st.session_state.request_sizes
+    if not sizes:
+        return
+    sent, full = sizes[-1]
+    st.caption(f"Last request: {sent / 1024:,.1f} KB sent of {full / 1024:,.1f} KB history")
+    with st.expander("📦 Request sizes"):
+        st.dataframe(
+            pd.DataFrame(sizes, columns=["Sent (bytes)", "Full history (bytes)"]),
+            use_container_width=True,
+        )
+
+
+def display_answer_cache_stats():
+    cache = get_answer_cache()
+    if cache.hits or cache.misses:
+        st.caption(
+            f"Answer cache: {cache.hits} hits, {cache.misses} misses, "
+            f"{cache.similar_offers} similar questions offered"
+        )
+
+
 def handle_user_inputs():
     """Handle user inputs from the chat interface."""
     # Handle chat input
@@ -104,6 +246,7 @@ def process_user_input(prompt: str):
     """
     # Clear previous warnings at the start of a new request
     st.session_state.warnings = []
+    start_turn()
 
     # Create a new message, append to history and display imidiately
     new_user_message = {
@@ -115,30 +258,175 @@ def process_user_input(prompt: str):
         user_msg_index = len(st.session_state.messages) - 1
         display_message(new_user_message["content"], user_msg_index)
 
-    # Show progress indicator inside analyst chat message while waiting for response
+    # Answer from the cache, or offer a similar cached question, or stream the
+    # response into the analyst chat message, or show a progress indicator while
+    # waiting for the complete response
     with st.chat_message("analyst"):
-        with st.spinner("Waiting for Analyst's response..."):
-            time.sleep(1)
-            response, error_msg = get_analyst_response(st.session_state.messages)
-            if error_msg is None:
-                analyst_message = {
+        cache_key = get_answer_cache_key(st.session_state.messages)
+        ask_analyst = st.session_state.pop("ask_analyst", None) == prompt
+        response = None
+        similar_question = None
+        if cache_key is not None:
+            wait_for_prefetch(cache_key)
+            with span("answer_cache"):
+                response = get_answer_cache().get(*cache_key)
+                if response is None and not ask_analyst:
+                    similar_question = get_answer_cache().find_similar(*cache_key)
+        if similar_question is not None:
+            # Another question's answer is never served in place of this one, as a
+            # single word (a year, a "not") can change its SQL: the user picks
+            st.session_state.messages.append(
+                {
                     "role": "analyst",
-                    "content": response["message"]["content"],
-                    "request_id": response["request_id"],
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "A similar question was answered before. "
+                            "Check that it asks the same thing before using its answer.",
+                        }
+                    ],
+                    "similar_question": similar_question,
+                    "question": prompt,
                 }
-            else:
-                analyst_message = {
-                    "role": "analyst",
-                    "content": [{"type": "text", "text": error_msg}],
-                    "request_id": response["request_id"],
-                }
-                st.session_state["fire_API_error_notify"] = True
+            )
+            st.rerun()
+        if response is not None:
+            error_msg = None
+        elif st.session_state.stream_responses:
+            with span("analyst_api"):
+                response, error_msg = stream_analyst_response(st.session_state.messages)
+        else:
+            with st.spinner("Waiting for Analyst's response..."), span("analyst_api"):
+                response, error_msg = get_analyst_response(st.session_state.messages)
+        if error_msg is None:
+            analyst_message = {
+                "role": "analyst",
+                "content": response["message"]["content"],
+                "request_id": response["request_id"],
+                "cached": response.get("cached", False),
+            }
+            if cache_key is not None and not analyst_message["cached"]:
+                get_answer_cache().put(*cache_key, prompt, response)
+        else:
+            analyst_message = {
+                "role": "analyst",
+                "content": [{"type": "text", "text": error_msg}],
+                "request_id": response["request_id"],
+            }
+            st.session_state["fire_API_error_notify"] = True
 
-            if "warnings" in response:
-                st.session_state.warnings = response["warnings"]
+        if "warnings" in response:
+            st.session_state.warnings = response["warnings"]
+
+        st.session_state.messages.append(analyst_message)
+        if error_msg is None:
+            prefetch_questions(get_likely_questions(analyst_message))
+        st.rerun()
+
+
+def start_turn():
+    """
+    Start tracing a new question. Its spans are grouped under one turn id, which
+    is also tagged on every Snowflake query it runs.
+    """
+    turn_id = uuid.uuid4().hex[:12]
+    st.session_state.trace = {
+        "turn": turn_id,
+        "started_at": time.perf_counter(),
+        "spans": [],
+        "render_pending": True,  # the rerun showing the answer completes the turn
+    }
+    session.query_tag = json.dumps({"app": QUERY_TAG_APP, "turn": turn_id})
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a stage of the current turn, keeping it for the latency panel and
+    appending it as a JSON line to TRACE_METRICS_PATH.
+    """
+    # Prefetch threads run outside the script and have no session state
+    if threading.current_thread().name.startswith(PREFETCH_THREAD_PREFIX):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = st.session_state.get("trace")
+        if trace is not None:
+            record = {
+                "turn": trace["turn"],
+                "stage": stage,
+                "start_ms": round((start - trace["started_at"]) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+            trace["spans"] = (trace["spans"] + [record])[-TRACE_MAX_SPANS:]
+            write_metric({"ts": datetime.utcnow().isoformat(), **record})
+
+
+@st.cache_resource
+def get_metrics_lock() -> threading.Lock:
+    return threading.Lock()
+
+
+def write_metric(record: Dict):
+    """
+    Append a span to TRACE_METRICS_PATH, first rotating the file to a single
+    ".1" backup once it reaches TRACE_METRICS_MAX_BYTES. Metrics are best effort,
+    so a failed write never fails the turn.
+    """
+    with get_metrics_lock():
+        try:
+            if (
+                os.path.exists(TRACE_METRICS_PATH)
+                and os.path.getsize(TRACE_METRICS_PATH) >= TRACE_METRICS_MAX_BYTES
+            ):
+                os.replace(TRACE_METRICS_PATH, TRACE_METRICS_PATH + ".1")
+            with open(TRACE_METRICS_PATH, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
 
-            st.session_state.messages.append(analyst_message)
-            st.rerun()
+
+def display_latency_panel():
+    """Display a waterfall of the current turn's spans and latency percentiles per stage."""
+    with st.expander("⏱️ Latency"):
+        trace = st.session_state.get("trace")
+        if trace is None or not trace["spans"]:
+            st.caption("Ask a question to trace it")
+        else:
+            end_ms = max(s["start_ms"] + s["duration_ms"] for s in trace["spans"])
+            scale = 30 / max(end_ms, 1)
+            lines = [
+                f"{s['stage']:<16}{' ' * int(s['start_ms'] * scale)}"
+                f"{'█' * max(int(s['duration_ms'] * scale), 1)} {s['duration_ms']:,.0f} ms"
+                for s in trace["spans"]
+            ]
+            st.caption(f"Turn `{trace['turn']}` (QUERY_TAG)")
+            st.code("\n".join(lines), language=None)
+        if st.toggle("p50/p95 across sessions", key="show_latency_percentiles"):
+            if os.path.exists(TRACE_METRICS_PATH):
+                st.dataframe(summarize_metrics(TRACE_METRICS_PATH), use_container_width=True)
+
+
+@st.cache_data(ttl=TRACE_SUMMARY_TTL, show_spinner=False)
+def summarize_metrics(path: str) -> pd.DataFrame:
+    """
+    Aggregate the recorded spans, including those of the rotated file, into a
+    count, p50 and p95 per stage. Cached briefly, as every rerun of the panel
+    would otherwise read the whole file.
+    """
+    paths = [p for p in (path + ".1", path) if os.path.exists(p)]
+    spans = pd.concat([pd.read_json(p, lines=True) for p in paths], ignore_index=True)
+    durations = spans.groupby("stage")["duration_ms"]
+    return pd.DataFrame(
+        {
+            "count": durations.count(),
+            "p50 (ms)": durations.quantile(0.5),
+            "p95 (ms)": durations.quantile(0.95),
+        }
+    )
 
 
 def display_warnings():
@@ -161,14 +449,11 @@ def get_analyst_response(messages: List[Dict]) -> Tuple[Dict, Optional[str]]:
         Optional[Dict]: The response from the Cortex Analyst API.
     """
     # Prepare the request body with the user's prompt
-    request_body = {
-        "messages": messages,
-        "semantic_model_file": f"@{st.session_state.selected_semantic_model_path}",
-    }
+    request_body = build_request_body(messages)
 
     # Send a POST request to the Cortex Analyst API endpoint
     # Adjusted to use positional arguments as per the API's requirement
-    resp = _snowflake.send_snow_api_request(
+    resp = ANALYST_TRANSPORT(
         "POST",  # method
         API_ENDPOINT,  # path
         {},  # headers
@@ -186,34 +471,395 @@ def get_analyst_response(messages: List[Dict]) -> Tuple[Dict, Optional[str]]:
         # Return the content of the response as a JSON object
         return parsed_content, None
     else:
-        # Craft readable error message
-        error_msg = f"""
+        return parsed_content, format_api_error(resp["status"], parsed_content)
+
+
+def compact_history(messages: List[Dict], window: int) -> List[Dict]:
+    """
+    Build the messages sent to the Analyst from the conversation history.
+
+    The last `window` turns are kept without their suggestions. Older turns are
+    dropped except for their questions, which are summarized in the first kept
+    question so that follow-ups still resolve.
+
+    Args:
+        messages (List[Dict]): The conversation history, ending with the new question.
+        window (int): The number of turns, including the new question, sent in full.
+
+    Returns:
+        List[Dict]: Messages alternating between user and analyst.
+    """
+    turns = []
+    for message in without_similar_offers(messages):
+        if message["role"] == "user" and turns and turns[-1][-1]["role"] == "user":
+            # A question left unanswered (the app stopped mid-request) would break
+            # the user/analyst alternation the Analyst requires
+            turns.pop()
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        content = [item for item in message["content"] if item["type"] != "suggestions"]
+        turns[-1].append({"role": message["role"], "content": content or message["content"]})
+    earlier, kept = turns[:-window], turns[-window:]
+    compacted = [message for turn in kept for message in turn]
+
+    questions = [
+        item["text"]
+        for turn in earlier
+        if turn[0]["role"] == "user"
+        for item in turn[0]["content"]
+        if item["type"] == "text"
+    ][-HISTORY_MAX_EARLIER_QUESTIONS:]
+    if questions:
+        summary = "Earlier questions in this conversation:\n" + "\n".join(
+            f"- {question}" for question in questions
+        )
+        # User messages carry a single text item, so the summary is prepended to it
+        compacted[0] = {
+            "role": "user",
+            "content": [
+                {**item, "text": f"{summary}\n\n{item['text']}"}
+                if item["type"] == "text"
+                else item
+                for item in compacted[0]["content"]
+            ],
+        }
+    return compacted
+
+
+def without_similar_offers(messages: List[Dict]) -> List[Dict]:
+    """
+    Drop the turns the app answered itself by offering a similar cached question.
+    The Analyst never saw them, so they are left out of its history and the
+    answer cache context.
+    """
+    kept = []
+    for message in messages:
+        if message.get("similar_question") is not None:
+            kept.pop()  # the question it answered
+        else:
+            kept.append(message)
+    return kept
+
+
+def build_request_body(messages: List[Dict], record_size: bool = True) -> Dict:
+    """Build an Analyst request from the compacted history and record its size."""
+    request_body = {
+        "messages": compact_history(messages, st.session_state.history_window),
+        "semantic_model_file": f"@{st.session_state.selected_semantic_model_path}",
+    }
+    if record_size:
+        st.session_state.request_sizes.append(
+            (len(json.dumps(request_body)), len(json.dumps(messages)))
+        )
+    return request_body
+
+
+def format_api_error(status: int, parsed_content: Dict) -> str:
+    """Craft a readable error message from an Analyst API error response."""
+    return f"""
 🚨 An Analyst API error has occurred 🚨
 
-* response code: `{resp['status']}`
-* request-id: `{parsed_content['request_id']}`
-* error code: `{parsed_content['error_code']}`
+* response code: `{status}`
+* request-id: `{parsed_content.get('request_id')}`
+* error code: `{parsed_content.get('error_code')}`
 
 Message:
 ```
-{parsed_content['message']}
+{parsed_content.get('message')}
 ```
         """
-        return parsed_content, error_msg
+
+
+def iter_sse_events(content: Union[str, Iterable]) -> Iterator[Tuple[str, Dict]]:
+    """
+    Parse a server-sent events body into (event, data) pairs.
+
+    Args:
+        content (Union[str, Iterable]): The whole body, or an iterable of lines
+            from a transport that streams the response.
+
+    Yields:
+        Tuple[str, Dict]: The event name and its JSON data.
+    """
+    lines = content.splitlines() if isinstance(content, str) else content
+    event, data = None, []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+        if line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:") :].strip())
+        elif not line and (event or data):
+            yield event or "message", parse_sse_data(data)
+            event, data = None, []
+    if event or data:
+        yield event or "message", parse_sse_data(data)
+
+
+def parse_sse_data(data: List[str]) -> Dict:
+    try:
+        return json.loads("\n".join(data)) if data else {}
+    except ValueError:
+        return {}
+
+
+def stream_analyst_response(messages: List[Dict]) -> Tuple[Dict, Optional[str]]:
+    """
+    Send chat history to the Cortex Analyst API in streaming mode, rendering
+    status, text and SQL as they arrive. Each SQL statement starts executing
+    as soon as it is complete. This happens before the response ends only with
+    a transport that streams (see ANALYST_TRANSPORT_STREAMS).
+
+    Args:
+        messages (List[Dict]): The conversation history.
+
+    Returns:
+        Tuple[Dict, Optional[str]]: The response assembled in the shape of a
+            non-streaming response, and the error message.
+    """
+    request_body = build_request_body(messages)
+    request_body["stream"] = True
+    resp = ANALYST_TRANSPORT(
+        "POST",  # method
+        API_ENDPOINT,  # path
+        {},  # headers
+        {},  # params
+        request_body,  # body
+        None,  # request_guid
+        API_TIMEOUT,  # timeout in milliseconds
+    )
+    if resp["status"] >= 400:
+        parsed_content = json.loads(resp["content"])
+        return parsed_content, format_api_error(resp["status"], parsed_content)
+
+    message_index = len(messages)  # index the analyst message will have
+    status_placeholder = st.empty()
+    placeholders = {}
+    content = {}
+    response = {"message": {"content": []}, "request_id": None}
+    error_msg = None
+    open_sql_index = None
+
+    def finish_sql():
+        # The statement is complete once the stream moves past it
+        if open_sql_index is not None:
+            start_message_query(message_index, content[open_sql_index]["statement"])
+
+    for event, data in iter_sse_events(resp["content"]):
+        response["request_id"] = data.get("request_id", response["request_id"])
+        if event == "status":
+            status_placeholder.caption(f"⏳ {data.get('status_message', data.get('status'))}")
+        elif event == "message.content.delta":
+            index = data["index"]
+            if open_sql_index is not None and index != open_sql_index:
+                finish_sql()
+                open_sql_index = None
+            if index not in placeholders:
+                placeholders[index] = st.empty()
+            if data["type"] == "text":
+                item = content.setdefault(index, {"type": "text", "text": ""})
+                item["text"] += data.get("text_delta", "")
+                placeholders[index].markdown(item["text"])
+            elif data["type"] == "sql":
+                item = content.setdefault(
+                    index, {"type": "sql", "statement": "", "confidence": None}
+                )
+                item["statement"] += data.get("statement_delta", "")
+                item["confidence"] = data.get("confidence", item["confidence"])
+                placeholders[index].code(item["statement"], language="sql")
+                open_sql_index = index
+            elif data["type"] == "suggestions":
+                item = content.setdefault(index, {"type": "suggestions", "suggestions": []})
+                delta = data["suggestions_delta"]
+                while len(item["suggestions"]) <= delta["index"]:
+                    item["suggestions"].append("")
+                item["suggestions"][delta["index"]] += delta.get("suggestion_delta", "")
+                placeholders[index].markdown(
+                    "\n".join(f"- {suggestion}" for suggestion in item["suggestions"])
+                )
+        elif event == "warnings":
+            response["warnings"] = data.get("warnings", [])
+        elif event == "error":
+            error_msg = format_api_error(
+                resp["status"], {**data, "error_code": data.get("code")}
+            )
+        elif event == "done":
+            break
+        if event != "message.content.delta" and open_sql_index is not None:
+            finish_sql()
+            open_sql_index = None
+    finish_sql()
+
+    status_placeholder.empty()
+    response["message"]["content"] = [content[index] for index in sorted(content)]
+    return response, error_msg
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and reduce it to its words."""
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+class AnswerCache:
+    """
+    Analyst responses shared by all sessions of the app, kept in a SQLite file.
+
+    Responses are keyed on the semantic model and its version, the questions asked
+    before in the history window, and the normalized question, and only served
+    for that exact key. For a question that misses, the most similar cached
+    question with the same context whose word overlap (Jaccard) reaches
+    `similarity` can be offered to the user instead.
+    """
+
+    def __init__(self, path: str, similarity: float):
+        self.similarity = similarity
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS analyst_answers (
+                model TEXT, version TEXT, context TEXT, question TEXT,
+                asked TEXT, response TEXT,
+                PRIMARY KEY (model, version, context, question)
+            )"""
+        )
+        self.hits = 0
+        self.misses = 0
+        self.similar_offers = 0
+
+    def get(self, model: str, version: str, context: str, question: str) -> Optional[Dict]:
+        """
+        Return the cached response marked as cached, or None. It has no request id,
+        as feedback on it would be filed against the request that produced it.
+        """
+        with self.lock:
+            # Answers built on an older version of the semantic model are stale
+            self.conn.execute(
+                "DELETE FROM analyst_answers WHERE model = ? AND version <> ?",
+                (model, version),
+            )
+            row = self.conn.execute(
+                "SELECT response FROM analyst_answers "
+                "WHERE model = ? AND version = ? AND context = ? AND question = ?",
+                (model, version, context, question),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**json.loads(row[0]), "request_id": None, "cached": True}
+
+    def find_similar(
+        self, model: str, version: str, context: str, question: str
+    ) -> Optional[str]:
+        """Return the question, as asked, of the most similar cached answer, or None."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT question, asked FROM analyst_answers "
+                "WHERE model = ? AND version = ? AND context = ? AND question <> ?",
+                (model, version, context, question),
+            ).fetchall()
+        tokens = set(question.split())
+        best, best_score = None, self.similarity
+        for other, asked in rows:
+            other_tokens = set(other.split())
+            score = len(tokens & other_tokens) / max(len(tokens | other_tokens), 1)
+            if score >= best_score:
+                best, best_score = asked, score
+        if best is not None:
+            self.similar_offers += 1
+        return best
+
+    def has(self, model: str, version: str, context: str, question: str) -> bool:
+        """Return whether the exact key is cached, without counting a hit or miss."""
+        with self.lock:
+            return (
+                self.conn.execute(
+                    "SELECT 1 FROM analyst_answers "
+                    "WHERE model = ? AND version = ? AND context = ? AND question = ?",
+                    (model, version, context, question),
+                ).fetchone()
+                is not None
+            )
+
+    def put(
+        self, model: str, version: str, context: str, question: str, asked: str, response: Dict
+    ):
+        """Cache a response, with the question as the user asked it."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analyst_answers VALUES (?, ?, ?, ?, ?, ?)",
+                (model, version, context, question, asked, json.dumps(response)),
+            )
+            self.conn.commit()
+
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    return AnswerCache(ANSWER_CACHE_PATH, ANSWER_CACHE_SIMILARITY)
+
+
+@st.cache_data(ttl=SEMANTIC_MODEL_VERSION_TTL, show_spinner=False)
+def get_semantic_model_version(path: str) -> str:
+    """Return the md5 and last-modified time of a semantic model file on its stage."""
+    rows = session.sql(f"LIST @{path}").collect()
+    return ";".join(f"{row['md5']}@{row['last_modified']}" for row in rows)
+
+
+def get_answer_cache_key(messages: List[Dict]) -> Optional[Tuple[str, str, str, str]]:
+    """
+    Key the newest question on the semantic model version and the questions
+    before it in the history window, or return None when the cache is off or
+    the model version cannot be read.
+    """
+    if not st.session_state.use_answer_cache:
+        return None
+    path = st.session_state.selected_semantic_model_path
+    try:
+        version = get_semantic_model_version(path)
+    except SnowparkSQLException:
+        return None
+    questions = [
+        normalize_question(item["text"])
+        for message in without_similar_offers(messages)
+        if message["role"] == "user"
+        for item in message["content"]
+        if item["type"] == "text"
+    ][-st.session_state.history_window :]
+    return path, version, "\n".join(questions[:-1]), questions[-1]
 
 
 def display_conversation():
     """
     Display the conversation history between the user and the assistant.
     """
-    for idx, message in enumerate(st.session_state.messages):
-        role = message["role"]
-        content = message["content"]
-        with st.chat_message(role):
-            if role == "analyst":
-                display_message(content, idx, message["request_id"])
-            else:
-                display_message(content, idx)
+    # Only the rerun that first shows a turn's answer is part of that turn; later
+    # reruns (widgets, feedback) would otherwise keep adding to its trace
+    trace = st.session_state.get("trace")
+    completes_turn = trace is not None and trace.pop("render_pending", False)
+    with span("render") if completes_turn else nullcontext():
+        for idx, message in enumerate(st.session_state.messages):
+            role = message["role"]
+            content = message["content"]
+            with st.chat_message(role):
+                if role == "analyst":
+                    if message.get("cached"):
+                        st.caption("⚡ Answered from cache")
+                    display_message(content, idx, message.get("request_id"))
+                    if message.get("similar_question") is not None:
+                        display_similar_question(message, idx)
+                else:
+                    display_message(content, idx)
+
+
+def display_similar_question(message: Dict, message_index: int):
+    """Let the user pick the similar cached question, or ask the Analyst their own."""
+    if st.button(f"↪️ {message['similar_question']}", key=f"similar_{message_index}"):
+        st.session_state.active_suggestion = message["similar_question"]
+    if st.button("🧠 Ask the Analyst my question", key=f"ask_analyst_{message_index}"):
+        st.session_state.active_suggestion = message["question"]
+        st.session_state.ask_analyst = message["question"]
 
 
 def display_message(
@@ -248,23 +894,575 @@ def display_message(
             pass
 
 
-@st.cache_data(show_spinner=False)
-def get_query_exec_result(query: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+class ResultStore:
+    """
+    Bounded store of SQL results for the analyst messages of one session.
+
+    Each message's SQL runs once and history re-renders read the stored result.
+    The least recently used values are evicted beyond `max_entries`. DataFrames
+    larger than `spill_bytes`, whether chart data or the first page of a
+    QueryResult, are pickled to a temporary directory, which is removed when the
+    store is closed or garbage collected with its session.
+    """
+
+    def __init__(self, max_entries: int, spill_bytes: int):
+        self.max_entries = max_entries
+        self.spill_bytes = spill_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.spill_dir = tempfile.mkdtemp(prefix="analyst_results_")
+        self._cleanup = weakref.finalize(
+            self, shutil.rmtree, self.spill_dir, ignore_errors=True
+        )
+
+    def __contains__(self, key: Tuple) -> bool:
+        return key in self.entries
+
+    def get(self, key: Tuple):
+        """Return the stored value, or None if not stored."""
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        value, spill_path = self.entries[key]
+        if spill_path is not None:
+            df = pd.read_pickle(spill_path)
+            value = df if value is None else value._replace(first_page=df)
+        return value
+
+    def put(self, key: Tuple, value):
+        """Store a value, spilling its DataFrame to disk if it is large."""
+        self._remove(key)
+        spill_path = None
+        # QueryResult is matched by its fields, as reruns redefine the class
+        df = value.first_page if hasattr(value, "first_page") else value
+        if (
+            isinstance(df, pd.DataFrame)
+            and df.memory_usage(deep=True).sum() > self.spill_bytes
+        ):
+            spill_path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.pkl")
+            df.to_pickle(spill_path)
+            value = value._replace(first_page=None) if df is not value else None
+        self.entries[key] = (value, spill_path)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        """Drop all results and their spill files."""
+        for key in list(self.entries):
+            self._remove(key)
+
+    def close(self):
+        """Drop all results and remove the spill directory."""
+        self.entries.clear()
+        self._cleanup()
+
+    def _remove(self, key: Tuple):
+        entry = self.entries.pop(key, None)
+        if entry is not None and entry[1] is not None:
+            os.remove(entry[1])
+
+
+class QueryResultCache:
+    """
+    Query results and result pages shared by all sessions of the app.
+
+    Entries expire after `ttl` seconds, and the least recently used entries are
+    evicted once the cached DataFrames exceed `budget_bytes`.
+    """
+
+    def __init__(self, ttl: int, budget_bytes: int):
+        self.ttl = ttl
+        self.budget_bytes = budget_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple):
+        """Return the cached value, or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple, value, df: Optional[pd.DataFrame]):
+        """Cache a value whose memory is held by `df`, staying within budget."""
+        size = int(df.memory_usage(deep=True).sum()) if df is not None else 0
+        if size > self.budget_bytes:
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.size_bytes += size
+            while self.size_bytes > self.budget_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: Tuple):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+
+@st.cache_resource
+def get_query_result_cache() -> QueryResultCache:
+    return QueryResultCache(QUERY_CACHE_TTL, QUERY_CACHE_BUDGET_BYTES)
+
+
+def get_query_cache_key(query: str) -> Tuple[str, str, str]:
+    """
+    Key a query on its SQL, the current role and the semantic model, so users
+    whose roles see different (masked) data never share results.
+    """
+    if "current_role" not in st.session_state:
+        st.session_state.current_role = session.get_current_role()
+    return (
+        query,
+        st.session_state.current_role,
+        st.session_state.selected_semantic_model_path,
+    )
+
+
+def get_message_result(message_index: int, query: str) -> QueryResult:
+    """
+    Return the result of a message's SQL query, executing it only the first time.
+
+    Args:
+        message_index (int): The index of the message.
+        query (str): The SQL query.
+
+    Returns:
+        QueryResult: The query id, row count, first page and error message.
+    """
+    store = st.session_state.result_store
+    key = (message_index, query)
+    result = store.get(key)
+    if result is None:
+        job = st.session_state.pending_queries.pop(key, None)
+        if job is not None:
+            result = get_async_query_result(job)
+            if result.err_msg is None:
+                get_query_result_cache().put(
+                    get_query_cache_key(query), result, result.first_page
+                )
+        else:
+            result = get_query_exec_result(query)
+        store.put(key, result)
+    return result
+
+
+def start_message_query(message_index: int, query: str):
+    """
+    Start executing a message's SQL query asynchronously, so the result is
+    ready by the time the message is displayed.
+
+    Args:
+        message_index (int): The index of the message.
+        query (str): The SQL query.
+    """
+    key = (message_index, query)
+    if key in st.session_state.pending_queries or key in st.session_state.result_store:
+        return
+    if get_query_result_cache().get(get_query_cache_key(query)) is not None:
+        return
+    try:
+        st.session_state.pending_queries[key] = session.sql(query).collect_nowait()
+    except QUERY_ERRORS:
+        pass  # The error is reported when the query is run again for display
+
+
+def get_async_query_result(job) -> QueryResult:
+    """Wait for a query job and read back its row count and first page."""
+    try:
+        with span("sql_execute"):
+            job.result("no_result")  # wait for the query without fetching its rows
+        with span("fetch"):
+            batches = get_result_batches(job.query_id)
+            row_count = sum(batch.rowcount for batch in batches)
+            first_page = read_batch_rows(batches, RESULT_PAGE_SIZE)
+        return QueryResult(job.query_id, row_count, first_page, None)
+    except QUERY_ERRORS as e:
+        return QueryResult(None, 0, None, str(e))
+
+
+def get_result_batches(query_id: str) -> list:
+    """
+    Return the result batches of a finished query, which Snowflake keeps for 24
+    hours. They are always in the result's order, unlike the rows of separate
+    RESULT_SCAN queries, so pages read from them never overlap or skip rows.
+    """
+    cursor = session.connection.cursor()
+    cursor.get_results_from_sfqid(query_id)
+    return cursor.get_result_batches() or []
+
+
+def read_batch_rows(batches: list, limit: int, offset: int = 0) -> pd.DataFrame:
+    """Read a slice of rows, downloading only the result batches that overlap it."""
+    frames = []
+    start = 0
+    for batch in batches:
+        end = start + batch.rowcount
+        if end > offset and start < offset + limit:
+            frames.append(batch.to_pandas().iloc[max(offset - start, 0) : offset + limit - start])
+        if end >= offset + limit:
+            break
+        start = end
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def fetch_result_rows(query_id: str, limit: int, offset: int = 0) -> pd.DataFrame:
+    """Fetch a slice of a finished query's result."""
+    with span("fetch"):
+        return read_batch_rows(get_result_batches(query_id), limit, offset)
+
+
+def get_query_exec_result(query: str) -> QueryResult:
     """
-    Execute the SQL query and convert the results to a pandas DataFrame.
+    Execute the SQL query once in Snowflake and fetch only its row count and first
+    page, reusing a cached result for the same query, role and semantic model.
 
     Args:
         query (str): The SQL query.
 
     Returns:
-        Tuple[Optional[pd.DataFrame], Optional[str]]: The query results and the error message.
+        QueryResult: The query id, row count, first page and error message.
     """
     global session
+    cache = get_query_result_cache()
+    key = get_query_cache_key(query)
+    result = cache.get(key)
+    if result is not None:
+        return result
     try:
-        df = session.sql(query).to_pandas()
-        return df, None
-    except SnowparkSQLException as e:
-        return None, str(e)
+        result = get_async_query_result(session.sql(query).collect_nowait())
+    except QUERY_ERRORS as e:
+        return QueryResult(None, 0, None, str(e))
+    if result.err_msg is None:
+        cache.put(key, result, result.first_page)
+    return result
+
+
+@st.cache_resource
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix=PREFETCH_THREAD_PREFIX
+    )
+
+
+@st.cache_data(show_spinner=False)
+def load_verified_questions(path: str, version: str) -> List[str]:
+    """Return the onboarding questions of a semantic model's verified queries."""
+    with session.file.get_stream(f"@{path}") as f:
+        model = yaml.safe_load(f)
+    return [
+        query["question"]
+        for query in model.get("verified_queries", [])
+        if query.get("use_as_onboarding_question")
+    ]
+
+
+def get_likely_questions(analyst_message: Dict) -> List[str]:
+    """
+    Return the questions the user is likely to ask after an analyst message:
+    its suggestions, and after the first answer the verified onboarding questions.
+    """
+    questions = [
+        suggestion
+        for item in analyst_message["content"]
+        if item["type"] == "suggestions"
+        for suggestion in item["suggestions"]
+    ]
+    if len(st.session_state.messages) == 2:
+        path = st.session_state.selected_semantic_model_path
+        try:
+            questions += load_verified_questions(path, get_semantic_model_version(path))
+        except (SnowparkSQLException, yaml.YAMLError):
+            pass
+    return list(dict.fromkeys(questions))
+
+
+def prefetch_questions(questions: List[str]):
+    """
+    Send questions to the Analyst in the background and run their SQL, so that
+    asking them next is answered from the answer and query result caches.
+    """
+    if not questions or not st.session_state.prefetch:
+        return
+    if not st.session_state.use_answer_cache:  # prefetched answers are read from it
+        return
+    answer_cache = get_answer_cache()
+    role, model_path = get_query_cache_key("")[1:]
+    # Prefetch threads share the session, whose query tag follows the user's
+    # current turn, so their queries are tagged per statement instead
+    trace = st.session_state.get("trace") or {}
+    query_tag = json.dumps({"app": QUERY_TAG_APP, "turn": trace.get("turn"), "prefetch": True})
+    for question in questions:
+        if st.session_state.prefetch_budget <= 0:
+            return
+        messages = st.session_state.messages + [
+            {"role": "user", "content": [{"type": "text", "text": question}]}
+        ]
+        cache_key = get_answer_cache_key(messages)
+        if (
+            cache_key is None
+            or cache_key in st.session_state.prefetches
+            or answer_cache.has(*cache_key)
+        ):
+            continue
+        st.session_state.prefetches[cache_key] = get_prefetch_executor().submit(
+            prefetch_answer,
+            build_request_body(messages, record_size=False),
+            cache_key,
+            question,
+            answer_cache,
+            get_query_result_cache(),
+            role,
+            model_path,
+            query_tag,
+        )
+        st.session_state.prefetch_budget -= 1
+
+
+def prefetch_answer(
+    request_body: Dict,
+    cache_key: Tuple[str, str, str, str],
+    question: str,
+    answer_cache: AnswerCache,
+    result_cache: QueryResultCache,
+    role: str,
+    model_path: str,
+    query_tag: str,
+):
+    """
+    Answer one question in a prefetch thread. Runs outside the script, so it only
+    touches the caches it is given and never session state. Its queries carry
+    `query_tag` rather than the session's.
+    """
+    resp = ANALYST_TRANSPORT(
+        "POST", API_ENDPOINT, {}, {}, request_body, None, API_TIMEOUT
+    )
+    if resp["status"] >= 400:
+        return
+    response = json.loads(resp["content"])
+    answer_cache.put(*cache_key, question, response)
+    for item in response["message"]["content"]:
+        if item["type"] != "sql":
+            continue
+        # Same key as get_query_cache_key
+        query_key = (item["statement"], role, model_path)
+        if result_cache.get(query_key) is not None:
+            continue
+        try:
+            job = session.sql(item["statement"]).collect_nowait(
+                statement_params={
+                    "STATEMENT_TIMEOUT_IN_SECONDS": PREFETCH_SQL_TIMEOUT,
+                    "QUERY_TAG": query_tag,
+                }
+            )
+        except QUERY_ERRORS:
+            continue
+        result = get_async_query_result(job)
+        if result.err_msg is None:
+            result_cache.put(query_key, result, result.first_page)
+
+
+def wait_for_prefetch(cache_key: Tuple[str, str, str, str]):
+    """Wait for a question that is still being prefetched instead of asking it twice."""
+    future: Optional[Future] = st.session_state.prefetches.get(cache_key)
+    if future is not None and not future.done():
+        with st.spinner("Waiting for Analyst's response..."), span("prefetch_wait"):
+            wait([future], timeout=API_TIMEOUT / 1000)
+
+
+def get_result_page(result: QueryResult, page: int) -> pd.DataFrame:
+    """Return one page (starting at 1) of a query result."""
+    if page == 1:
+        return result.first_page
+    cache = get_query_result_cache()
+    key = ("page", result.query_id, page)
+    df = cache.get(key)
+    if df is None:
+        df = fetch_result_rows(
+            result.query_id, RESULT_PAGE_SIZE, (page - 1) * RESULT_PAGE_SIZE
+        )
+        cache.put(key, df, df)
+    return df
+
+
+def get_message_chart_data(
+    message_index: int, query: str, result: QueryResult
+) -> pd.DataFrame:
+    """Return all rows of a result within the row cap for charting."""
+    if result.row_count <= RESULT_PAGE_SIZE:
+        return result.first_page
+    store = st.session_state.result_store
+    key = (message_index, query, "chart", st.session_state.max_result_rows)
+    df = store.get(key)
+    if df is None:
+        df = fetch_result_rows(result.query_id, st.session_state.max_result_rows)
+        store.put(key, df)
+    return df
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a result column name for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_aggregated_chart_data(result: QueryResult, kind: str, sql: str) -> pd.DataFrame:
+    """Run a chart aggregation over a query result in Snowflake, caching the output."""
+    cache = get_query_result_cache()
+    key = ("chart", result.query_id, kind, sql)
+    df = cache.get(key)
+    if df is None:
+        with span("chart_aggregate"):
+            df = session.sql(sql).to_pandas()
+        cache.put(key, df, df)
+    return df
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Pick the points of a series to keep with Largest-Triangle-Three-Buckets, which
+    preserves peaks and troughs far better than taking every n-th point.
+
+    Args:
+        x (np.ndarray): Sorted x values.
+        y (np.ndarray): The y values.
+        threshold (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: Positions of the points to keep, first and last included.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices.append(a)
+    indices.append(n - 1)
+    return np.array(indices)
+
+
+def downsample_line(df: pd.DataFrame, x_col: str, y_col: str) -> pd.DataFrame:
+    """Sort a line series by x and reduce it to at most CHART_MAX_POINTS points."""
+    df = df[[x_col, y_col]].assign(**{y_col: pd.to_numeric(df[y_col], errors="coerce")})
+    df = df.dropna().sort_values(x_col)
+    if len(df) <= CHART_MAX_POINTS:
+        return df
+    x = df[x_col]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype("int64")
+    elif not pd.api.types.is_numeric_dtype(x):
+        # Categorical x values are evenly spaced on the chart
+        x = np.arange(len(df))
+    keep = lttb_indices(
+        np.asarray(x, dtype=float), df[y_col].to_numpy(dtype=float), CHART_MAX_POINTS
+    )
+    return df.iloc[keep]
+
+
+def get_line_chart_data(
+    result: QueryResult, message_index: int, query: str, x_col: str, y_col: str
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Return a line series of at most CHART_MAX_POINTS points, and a note saying how
+    it was reduced, if it was. Results over the row cap are first averaged into
+    equal-sized buckets along x in Snowflake.
+    """
+    aggregated = result.row_count > st.session_state.max_result_rows
+    if not aggregated:
+        df = get_message_chart_data(message_index, query, result)
+    else:
+        x, y = quote_identifier(x_col), quote_identifier(y_col)
+        df = get_aggregated_chart_data(
+            result,
+            "line",
+            f"""SELECT MIN({x}) AS {x}, AVG({y}) AS {y}
+FROM (
+    SELECT {x}, {y}, NTILE({CHART_MAX_POINTS * 4}) OVER (ORDER BY {x}) AS BUCKET
+    FROM TABLE(RESULT_SCAN('{result.query_id}'))
+    WHERE {x} IS NOT NULL AND {y} IS NOT NULL
+)
+GROUP BY BUCKET
+ORDER BY 1""",
+        )
+    line = downsample_line(df, x_col, y_col)
+    notes = []
+    if aggregated:
+        notes.append(
+            f"{result.row_count:,} rows averaged into {len(df):,} buckets in Snowflake"
+        )
+    if len(line) < len(df) and len(line) == CHART_MAX_POINTS:
+        notes.append(f"{len(line):,} of {len(df):,} points drawn")
+    return line, "; ".join(notes) or None
+
+
+def get_bar_chart_data(
+    result: QueryResult, message_index: int, query: str, x_col: str, y_col: str
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Return y summed per x value for the CHART_TOP_N largest bars, with the rest
+    summed into a single "Other" bar, and a note saying how it was reduced, if it
+    was. Results over the row cap are aggregated in Snowflake.
+    """
+    if result.row_count > st.session_state.max_result_rows:
+        x, y = quote_identifier(x_col), quote_identifier(y_col)
+        df = get_aggregated_chart_data(
+            result,
+            "bar",
+            f"""WITH totals AS (
+    SELECT {x}::STRING AS {x}, SUM({y}) AS {y}
+    FROM TABLE(RESULT_SCAN('{result.query_id}'))
+    GROUP BY 1
+), ranked AS (
+    SELECT {x}, {y}, ROW_NUMBER() OVER (ORDER BY {y} DESC NULLS LAST) AS RANK
+    FROM totals
+)
+SELECT IFF(RANK <= {CHART_TOP_N}, {x}, 'Other') AS {x}, SUM({y}) AS {y}
+FROM ranked
+GROUP BY 1
+ORDER BY 2 DESC""",
+        )
+        note = f"{result.row_count:,} rows summed per {x_col} in Snowflake"
+        if len(df) > CHART_TOP_N:
+            note += f'; values beyond the {CHART_TOP_N} largest are grouped into "Other"'
+        return df, note
+    df = get_message_chart_data(message_index, query, result)
+    totals = (
+        pd.to_numeric(df[y_col], errors="coerce")
+        .groupby(df[x_col])
+        .sum()
+        .sort_values(ascending=False)
+    )
+    note = None
+    if len(totals) > CHART_TOP_N:
+        note = (
+            f'{len(totals) - CHART_TOP_N:,} of {len(totals):,} {x_col} values '
+            f'are grouped into "Other"'
+        )
+        other = totals.iloc[CHART_TOP_N:].sum()
+        totals = totals.iloc[:CHART_TOP_N]
+        totals.index = totals.index.astype(str)
+        totals["Other"] = other
+    return totals.rename_axis(x_col).reset_index(name=y_col), note
 
 
 def display_sql_confidence(confidence: dict):
@@ -312,34 +1510,69 @@ def display_sql_query(
     # Display the results of the SQL query
     with st.expander("Results", expanded=True):
         with st.spinner("Running SQL..."):
-            df, err_msg = get_query_exec_result(sql)
-            if df is None:
-                st.error(f"Could not execute generated SQL query. Error: {err_msg}")
-            elif df.empty:
+            result = get_message_result(message_index, sql)
+            if result.err_msg is not None:
+                st.error(f"Could not execute generated SQL query. Error: {result.err_msg}")
+            elif result.row_count == 0:
                 st.write("Query returned no data")
             else:
                 # Show query results in two tabs
                 data_tab, chart_tab = st.tabs(["Data 📄", "Chart 📉"])
                 with data_tab:
-                    st.dataframe(df, use_container_width=True)
+                    display_result_pages(result, message_index)
 
                 with chart_tab:
-                    display_charts_tab(df, message_index)
+                    display_charts_tab(result, message_index, sql)
     if request_id:
-        display_feedback_section(request_id)
+        display_feedback_section(request_id, message_index)
 
 
-def display_charts_tab(df: pd.DataFrame, message_index: int) -> None:
+@st.fragment
+def display_result_pages(result: QueryResult, message_index: int) -> None:
     """
-    Display the charts tab.
+    Display a query result one page at a time, fetching later pages on demand.
 
     Args:
-        df (pd.DataFrame): The query results.
+        result (QueryResult): The query result.
         message_index (int): The index of the message.
     """
+    row_cap = st.session_state.max_result_rows
+    shown_rows = min(result.row_count, row_cap)
+    page_count = -(-shown_rows // RESULT_PAGE_SIZE)
+    page = 1
+    if page_count > 1:
+        page = st.number_input(
+            f"Page (of {page_count:,})",
+            min_value=1,
+            max_value=page_count,
+            key=f"result_page_{message_index}",
+        )
+    df = get_result_page(result, page).iloc[: shown_rows - (page - 1) * RESULT_PAGE_SIZE]
+    st.dataframe(df, use_container_width=True)
+    if result.row_count > row_cap:
+        st.caption(
+            f"⚠️ Truncated: showing the first {row_cap:,} of {result.row_count:,} rows "
+            "(raise the result row cap in the sidebar to see more)"
+        )
+    else:
+        st.caption(f"{result.row_count:,} rows")
+
+
+@st.fragment
+def display_charts_tab(result: QueryResult, message_index: int, query: str) -> None:
+    """
+    Display the charts tab. Changing the axes or chart type reruns only this tab,
+    and at most CHART_MAX_POINTS points or CHART_TOP_N + 1 bars are drawn, with a
+    note whenever the data was aggregated, grouped or downsampled to fit.
+
+    Args:
+        result (QueryResult): The query result.
+        message_index (int): The index of the message.
+        query (str): The SQL query.
+    """
     # There should be at least 2 columns to draw charts
-    if len(df.columns) >= 2:
-        all_cols_set = set(df.columns)
+    if len(result.first_page.columns) >= 2:
+        all_cols_set = set(result.first_page.columns)
         col1, col2 = st.columns(2)
         x_col = col1.selectbox(
             "X axis", all_cols_set, key=f"x_col_select_{message_index}"
@@ -354,18 +1587,25 @@ def display_charts_tab(df: pd.DataFrame, message_index: int) -> None:
             options=["Line Chart 📈", "Bar Chart 📊"],
             key=f"chart_type_{message_index}",
         )
-        if chart_type == "Line Chart 📈":
-            st.line_chart(df.set_index(x_col)[y_col])
-        elif chart_type == "Bar Chart 📊":
-            st.bar_chart(df.set_index(x_col)[y_col])
+        try:
+            if chart_type == "Line Chart 📈":
+                df, note = get_line_chart_data(result, message_index, query, x_col, y_col)
+                st.line_chart(df.set_index(x_col)[y_col])
+            elif chart_type == "Bar Chart 📊":
+                df, note = get_bar_chart_data(result, message_index, query, x_col, y_col)
+                st.bar_chart(df.set_index(x_col)[y_col])
+            if note:
+                st.caption(f"⚠️ {note}")
+        except QUERY_ERRORS as e:
+            st.error(f"Could not aggregate chart data. Error: {e}")
     else:
         st.write("At least 2 columns are required")
 
 
-def display_feedback_section(request_id: str):
+def display_feedback_section(request_id: str, message_index: int):
     with st.popover("📝 Query Feedback"):
         if request_id not in st.session_state.form_submitted:
-            with st.form(f"feedback_form_{request_id}", clear_on_submit=True):
+            with st.form(f"feedback_form_{message_index}_{request_id}", clear_on_submit=True):
                 positive = st.radio(
                     "Rate the generated SQL", options=["👍", "👎"], horizontal=True
                 )
@@ -399,7 +1639,7 @@ def submit_feedback(
         "positive": positive,
         "feedback_message": feedback_message,
     }
-    resp = _snowflake.send_snow_api_request(
+    resp = ANALYST_TRANSPORT(
         "POST",  # method
         FEEDBACK_API_ENDPOINT,  # path
         {},  # headers
@@ -0,0 +1,65 @@
+# Checks that CHUNK_TRANSCRIPT (the Python UDTF in scripts/setup.sql) produces chunks
+# of at most MAX_TOKENS that overlap their predecessor and together cover the whole
+# transcript, for call-like transcripts with long speaker turns and for text with
+# no punctuation at all.
+#
+#   python benchmarks/chunk_check.py
+import os
+import random
+import re
+
+SETUP_SQL = os.path.join(os.path.dirname(__file__), "..", "scripts", "setup.sql")
+WORDS = "claim coverage plan member deductible copay pharmacy lipitor refill policy bill".split()
+
+
+def load_udtf(name):
+    """Run the Python body of a function created in setup.sql and return its namespace."""
+    with open(SETUP_SQL) as f:
+        sql = f.read()
+    start = sql.index("$$", sql.index(f"CREATE OR REPLACE FUNCTION {name}(")) + 2
+    namespace = {}
+    exec(sql[start:sql.index("$$", start)], namespace)
+    return namespace
+
+
+def call_transcript(rng, turns, min_words, max_words):
+    lines = []
+    for turn in range(turns):
+        words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+        sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+        lines.append(f"{'Agent' if turn % 2 == 0 else 'Customer'}: {' '.join(sentences)}")
+    return "\n".join(lines)
+
+
+def check(chunker, text, max_tokens, overlap_tokens):
+    """Assert sizes, overlap and coverage, and return the chunk count."""
+    chunks = list(chunker.process(text, max_tokens, overlap_tokens))
+    words = [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]
+    covered = set()
+    for index, start, end, chunk_text in chunks:
+        assert len(chunk_text.split()) <= max_tokens, (index, len(chunk_text.split()))
+        covered.update(i for i, (w_start, w_end) in enumerate(words) if start <= w_start and w_end <= end)
+    assert covered == set(range(len(words))), "words missing from every chunk"
+    for (_, _, prev_end, _), (index, start, _, _) in zip(chunks, chunks[1:]):
+        overlap = len(text[start:prev_end].split())
+        assert 0 < overlap <= overlap_tokens, (index, overlap)
+    return len(chunks)
+
+
+def main():
+    chunker = load_udtf("CHUNK_TRANSCRIPT")["TranscriptChunker"]()
+    rng = random.Random(0)
+    cases = {
+        "40 turns of 50-90 words": call_transcript(rng, 40, 50, 90),
+        "40 turns of 300-400 words": call_transcript(rng, 40, 300, 400),
+        "60 turns of 5-20 words": call_transcript(rng, 60, 5, 20),
+        "1000 words, no punctuation": " ".join(rng.choices(WORDS, k=1000)),
+    }
+    for max_tokens, overlap_tokens in [(256, 48), (128, 32), (64, 8)]:
+        for name, text in cases.items():
+            count = check(chunker, text, max_tokens, overlap_tokens)
+            print(f"{max_tokens:>4}/{overlap_tokens:<3} {name:<28} {count:>4} chunks, all overlapping")
+
+
+if __name__ == "__main__":
+    main()
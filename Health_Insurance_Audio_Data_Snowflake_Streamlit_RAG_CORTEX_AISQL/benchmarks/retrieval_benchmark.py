@@ -0,0 +1,156 @@
+# Query latency (p50/p95) and recall@k of the app's local retrieval engines over a
+# labeled question set: BM25 (HybridSearch), a dense index, their fusion, and the
+# dense results re-ranked with rerank() as the app re-ranks Cortex Search results.
+#
+# The corpus is call_transcripts.json, chunked with CHUNK_TRANSCRIPT from setup.sql,
+# or an export of CALL_TRANSCRIPT_CHUNKS (CSV with RELATIVE_PATH, CHUNK_TEXT,
+# START_OFFSET and END_OFFSET) with its own labeled questions. Dense vectors come from
+# hashed character trigrams, a local stand-in for EMBED_TEXT_768, so dense latency
+# excludes the embedding call and dense recall is only indicative.
+#
+#   python benchmarks/retrieval_benchmark.py [--chunks chunks.csv --questions q.json]
+#                                            [--k 1 3 5] [--repeat 20]
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+import zlib
+
+import pandas as pd
+
+from chunk_check import load_udtf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "streamlit"))
+from hybrid_search import DenseIndex, HybridSearch, rank, rerank  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "call_transcripts.json")
+RERANK_CANDIDATES = 3  # as in the app: candidates fetched per chunk kept
+EMBED_DIM = 512
+TRIGRAM_WORD = re.compile(r"\w+")
+
+
+def embed(texts):
+    """Hashed character-trigram vectors, standing in for EMBED_TEXT_768 offline."""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * EMBED_DIM
+        for word in TRIGRAM_WORD.findall(text.lower()):
+            word = f"#{word}#"
+            for i in range(len(word) - 2):
+                vector[zlib.crc32(word[i:i + 3].encode()) % EMBED_DIM] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def to_chunks(rows):
+    """Chunk rows with the columns LOCAL_CHUNKS_SQL returns in the app."""
+    return pd.DataFrame([
+        {
+            "CHUNK": f"Audio File Name: {path}: Transcript - {text}",
+            "FILE_NAME": path.rsplit("/", 1)[-1],
+            "START_OFFSET": start,
+            "END_OFFSET": end,
+        }
+        for path, text, start, end in rows
+    ])
+
+
+def fixture_chunks(transcripts, max_tokens, overlap_tokens):
+    chunker = load_udtf("CHUNK_TRANSCRIPT")["TranscriptChunker"]()
+    return to_chunks(
+        (path, text, start, end)
+        for path, transcript in transcripts.items()
+        for _, start, end, text in chunker.process(transcript, max_tokens, overlap_tokens)
+    )
+
+
+def exported_chunks(path):
+    df = pd.read_csv(path)
+    df.columns = [column.upper() for column in df.columns]
+    return to_chunks(df[["RELATIVE_PATH", "CHUNK_TEXT", "START_OFFSET", "END_OFFSET"]].itertuples(index=False))
+
+
+def engines(chunks):
+    """Search functions (question, limit) -> chunks, and their index build times."""
+    start = time.perf_counter()
+    bm25 = HybridSearch(chunks)
+    bm25_s = time.perf_counter() - start
+    start = time.perf_counter()
+    dense = DenseIndex(chunks["CHUNK"].tolist(), embed)
+    dense_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hybrid = HybridSearch(chunks, embed=embed)
+    hybrid_s = time.perf_counter() - start
+
+    def dense_search(question, limit):
+        return chunks.iloc[rank(dense.scores(question))[:limit]].reset_index(drop=True)
+
+    def dense_rerank(question, limit):
+        candidates = dense_search(question, limit * RERANK_CANDIDATES)
+        return rerank(question, candidates, embed=embed).head(limit)
+
+    return {
+        "BM25": (bm25.search, bm25_s),
+        "Dense": (dense_search, dense_s),
+        "BM25 + dense (RRF)": (hybrid.search, hybrid_s),
+        "Dense + re-rank": (dense_rerank, dense_s),
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def measure(search, questions, ks, repeat):
+    """Latencies in ms of every search, and recall@k per k over the questions."""
+    latencies, hits = [], {k: 0 for k in ks}
+    for item in questions:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = search(item["question"], max(ks))
+            latencies.append((time.perf_counter() - start) * 1000)
+        files = results["FILE_NAME"].tolist()
+        for k in ks:
+            hits[k] += any(name in files[:k] for name in item["relevant"])
+    return latencies, {k: hits[k] / len(questions) for k in ks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", help="CSV export of CALL_TRANSCRIPT_CHUNKS (default: the fixture)")
+    parser.add_argument("--questions", help="JSON list of {question, relevant: [file names]}")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=20, help="searches timed per question")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=48)
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    if args.chunks:
+        chunks = exported_chunks(args.chunks)
+    else:
+        chunks = fixture_chunks(fixture["transcripts"], args.max_tokens, args.overlap_tokens)
+    if args.questions:
+        with open(args.questions) as f:
+            questions = json.load(f)
+    else:
+        questions = fixture["questions"]
+
+    print(f"corpus: {len(chunks)} chunks of {chunks['FILE_NAME'].nunique()} recordings; "
+          f"{len(questions)} labeled questions, {args.repeat} searches each")
+    recall_header = " ".join(f"{'R@' + str(k):>6}" for k in args.k)
+    print(f"{'engine':<20} {'index ms':>9} {'p50 ms':>8} {'p95 ms':>8} {recall_header}")
+    for name, (search, build_s) in engines(chunks).items():
+        latencies, recall = measure(search, questions, args.k, args.repeat)
+        recall_cells = " ".join(f"{recall[k]:>6.0%}" for k in args.k)
+        print(f"{name:<20} {build_s * 1000:>9.1f} {percentile(latencies, 50):>8.2f} "
+              f"{percentile(latencies, 95):>8.2f} {recall_cells}")
+
+
+if __name__ == "__main__":
+    main()
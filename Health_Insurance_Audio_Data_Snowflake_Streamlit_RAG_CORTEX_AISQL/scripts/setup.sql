@@ -1,13 +1,13 @@
 USE ROLE ACCOUNTADMIN;
-CREATE OR REPLACE WAREHOUSE HC_AISQL_WH;
-CREATE OR REPLACE DATABASE HC_AISQL_DB;
-CREATE OR REPLACE SCHEMA HC_AISQL_DB.HC_AISQL_SCHEMA;
+CREATE WAREHOUSE IF NOT EXISTS HC_AISQL_WH;
+CREATE DATABASE IF NOT EXISTS HC_AISQL_DB;
+CREATE SCHEMA IF NOT EXISTS HC_AISQL_DB.HC_AISQL_SCHEMA;
 
 USE WAREHOUSE HC_AISQL_WH;
 USE DATABASE HC_AISQL_DB;
 USE SCHEMA HC_AISQL_SCHEMA;
 
-CREATE STAGE HC_AISQL_STAGE 
+CREATE STAGE IF NOT EXISTS HC_AISQL_STAGE 
 	DIRECTORY = ( ENABLE = true ) 
 	ENCRYPTION = ( TYPE = 'SNOWFLAKE_SSE' );
 
@@ -16,50 +16,458 @@ CREATE STAGE HC_AISQL_STAGE
 -- List files in the stage
 SELECT * FROM DIRECTORY(@HC_AISQL_DB.HC_AISQL_SCHEMA.HC_AISQL_STAGE);
 
--- Load call recording(audio/mpeg files) directly from stage using FILE data type
-CREATE OR REPLACE TABLE HC_AISQL_DB.HC_AISQL_SCHEMA.CALL_RECORDINGS AS
-SELECT TO_FILE(FILE_URL) AUDIO_FILE, *
-FROM DIRECTORY(@HC_AISQL_DB.HC_AISQL_SCHEMA.HC_AISQL_STAGE)
-WHERE RELATIVE_PATH LIKE 'CALL_RECORDINGS/%';
+-- Call recordings (audio/mpeg files) loaded directly from stage using FILE data type,
+-- with their transcript and call reason. Filled incrementally by INGEST_CALL_RECORDINGS,
+-- so these objects are kept when setup is run again
+CREATE TABLE IF NOT EXISTS HC_AISQL_DB.HC_AISQL_SCHEMA.CALL_RECORDINGS (
+  AUDIO_FILE FILE,
+  RELATIVE_PATH STRING,
+  SIZE NUMBER,
+  LAST_MODIFIED TIMESTAMP_TZ,
+  MD5 STRING,
+  ETAG STRING,
+  FILE_URL STRING,
+  CALL_TRANSCRIPT STRING,
+  AI_CALL_REASON STRING
+);
+
+/*
+Incremental transcription and classification
+- CALL_RECORDINGS_STATE records the MD5/ETAG of every recording seen in the stage directory and whether it has been processed,
+- only new or changed files are transcribed (AI_TRANSCRIBE) and classified (AI_CLASSIFY), so 10 new calls cost 10 transcriptions rather than the whole archive,
+- files are processed in bounded batches running concurrently as asynchronous child jobs; a failed batch is retried file by file, up to MAX_ATTEMPTS per file.
+*/
+CREATE TABLE IF NOT EXISTS CALL_RECORDINGS_STATE (
+  RELATIVE_PATH STRING PRIMARY KEY,
+  MD5 STRING,
+  ETAG STRING,
+  STATUS STRING, -- PENDING, DONE or FAILED
+  ATTEMPTS NUMBER,
+  LAST_ERROR STRING,
+  UPDATED_AT TIMESTAMP_LTZ
+);
+
+-- Stage directory changes, drained into CALL_RECORDINGS_FILE_EVENTS on every ingest run
+CREATE STREAM IF NOT EXISTS CALL_RECORDINGS_FILES_STREAM ON STAGE HC_AISQL_STAGE;
+
+CREATE TABLE IF NOT EXISTS CALL_RECORDINGS_FILE_EVENTS (
+  RELATIVE_PATH STRING,
+  MD5 STRING,
+  ETAG STRING,
+  ACTION STRING,
+  RECORDED_AT TIMESTAMP_LTZ
+);
+
+CREATE OR REPLACE PROCEDURE INGEST_CALL_RECORDINGS(
+  BATCH_SIZE INT DEFAULT 5,
+  MAX_CONCURRENCY INT DEFAULT 4,
+  MAX_ATTEMPTS INT DEFAULT 3
+)
+returns string
+language python
+runtime_version = '3.11'
+packages = ('snowflake-snowpark-python')
+handler = 'ingest'
+as
+$$
+import json
+import time
+from collections import deque
+from snowflake.connector.errors import DatabaseError
+from snowflake.snowpark.exceptions import SnowparkSQLException
+
+# Errors of a failed batch: Snowpark raises SnowparkSQLException, while async query
+# jobs raise the connector's ProgrammingError or other DatabaseError subclasses
+QUERY_ERRORS = (SnowparkSQLException, DatabaseError)
+
+RECORDINGS = "RELATIVE_PATH LIKE 'CALL_RECORDINGS/%'"
+
+DRAIN_EVENTS_SQL = """
+INSERT INTO CALL_RECORDINGS_FILE_EVENTS
+SELECT RELATIVE_PATH, MD5, ETAG, METADATA$ACTION, CURRENT_TIMESTAMP()
+FROM CALL_RECORDINGS_FILES_STREAM
+"""
+
+# A file is (re)queued when it is new or its MD5/ETAG differs from the last one seen
+DETECT_CHANGES_SQL = f"""
+MERGE INTO CALL_RECORDINGS_STATE s
+USING (
+  SELECT RELATIVE_PATH, MD5, ETAG FROM DIRECTORY(@HC_AISQL_STAGE) WHERE {RECORDINGS}
+) d
+ON s.RELATIVE_PATH = d.RELATIVE_PATH
+WHEN MATCHED AND (s.MD5 IS DISTINCT FROM d.MD5 OR s.ETAG IS DISTINCT FROM d.ETAG) THEN UPDATE SET
+  MD5 = d.MD5, ETAG = d.ETAG, STATUS = 'PENDING', ATTEMPTS = 0, LAST_ERROR = NULL,
+  UPDATED_AT = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED THEN INSERT (RELATIVE_PATH, MD5, ETAG, STATUS, ATTEMPTS, UPDATED_AT)
+  VALUES (d.RELATIVE_PATH, d.MD5, d.ETAG, 'PENDING', 0, CURRENT_TIMESTAMP())
+"""
+
+PENDING_SQL = """
+SELECT RELATIVE_PATH, ATTEMPTS FROM CALL_RECORDINGS_STATE
+WHERE STATUS <> 'DONE' AND ATTEMPTS < ?
+ORDER BY RELATIVE_PATH
+"""
 
-SELECT * FROM HC_AISQL_DB.HC_AISQL_SCHEMA.CALL_RECORDINGS;
+# Transcribes and classifies one batch of files, bound as a JSON array of paths
+PROCESS_BATCH_SQL = """
+MERGE INTO CALL_RECORDINGS r
+USING (
+  SELECT *,
+    AI_CLASSIFY(CALL_TRANSCRIPT, ['claims related', 'coverage related',
+      'billing related', 'other']):labels[0]::text AS AI_CALL_REASON
+  FROM (
+    SELECT TO_FILE(FILE_URL) AS AUDIO_FILE, RELATIVE_PATH, SIZE, LAST_MODIFIED, MD5, ETAG, FILE_URL,
+      AI_TRANSCRIBE(TO_FILE(FILE_URL)):text::STRING AS CALL_TRANSCRIPT
+    FROM DIRECTORY(@HC_AISQL_STAGE)
+    WHERE ARRAY_CONTAINS(RELATIVE_PATH::VARIANT, PARSE_JSON(?))
+  )
+) f
+ON r.RELATIVE_PATH = f.RELATIVE_PATH
+WHEN MATCHED THEN UPDATE SET
+  AUDIO_FILE = f.AUDIO_FILE, SIZE = f.SIZE, LAST_MODIFIED = f.LAST_MODIFIED, MD5 = f.MD5,
+  ETAG = f.ETAG, FILE_URL = f.FILE_URL, CALL_TRANSCRIPT = f.CALL_TRANSCRIPT,
+  AI_CALL_REASON = f.AI_CALL_REASON
+WHEN NOT MATCHED THEN INSERT VALUES (
+  f.AUDIO_FILE, f.RELATIVE_PATH, f.SIZE, f.LAST_MODIFIED, f.MD5, f.ETAG, f.FILE_URL,
+  f.CALL_TRANSCRIPT, f.AI_CALL_REASON
+)
+"""
+
+MARK_SQL = """
+UPDATE CALL_RECORDINGS_STATE
+SET STATUS = ?, ATTEMPTS = ATTEMPTS + 1, LAST_ERROR = ?, UPDATED_AT = CURRENT_TIMESTAMP()
+WHERE ARRAY_CONTAINS(RELATIVE_PATH::VARIANT, PARSE_JSON(?))
+"""
+
+
+def mark(session, paths, status, error=None):
+    session.sql(MARK_SQL, params=[status, error, json.dumps(paths)]).collect()
 
-ALTER TABLE CALL_RECORDINGS ADD COLUMN CALL_TRANSCRIPT STRING;
 
-UPDATE CALL_RECORDINGS 
-SET CALL_TRANSCRIPT = AI_TRANSCRIBE(AUDIO_FILE):text::STRING;
+def ingest(session, batch_size, max_concurrency, max_attempts):
+    session.sql(DRAIN_EVENTS_SQL).collect()
+    session.sql(DETECT_CHANGES_SQL).collect()
+    pending = session.sql(PENDING_SQL, params=[max_attempts]).collect()
+    attempts = {row["RELATIVE_PATH"]: row["ATTEMPTS"] for row in pending}
+    paths = list(attempts)
+    queue = deque(paths[i:i + batch_size] for i in range(0, len(paths), batch_size))
 
-ALTER TABLE CALL_RECORDINGS ADD COLUMN AI_CALL_REASON STRING;
+    running, done, failed = [], 0, 0
+    while queue or running:
+        while queue and len(running) < max_concurrency:
+            batch = queue.popleft()
+            job = session.sql(PROCESS_BATCH_SQL, params=[json.dumps(batch)]).collect_nowait()
+            running.append((batch, job))
+        time.sleep(1)
+        for batch, job in [(b, j) for b, j in running if j.is_done()]:
+            running.remove((batch, job))
+            try:
+                job.result()
+                mark(session, batch, 'DONE')
+                done += len(batch)
+            except QUERY_ERRORS as e:
+                if len(batch) > 1:
+                    # Retry file by file so one bad recording does not block the batch
+                    queue.extend([path] for path in batch)
+                    continue
+                mark(session, batch, 'FAILED', str(e)[:1000])
+                attempts[batch[0]] += 1
+                if attempts[batch[0]] < max_attempts:
+                    queue.append(batch)
+                else:
+                    failed += 1
+    return f"Processed {done} of {len(paths)} new or changed recordings, {failed} failed"
+$$;
 
-UPDATE CALL_RECORDINGS 
-SET AI_CALL_REASON = AI_CLASSIFY(CALL_TRANSCRIPT, ['claims related', 'coverage related', 
-'billing related','other']):labels[0]::text;
+-- Hourly, in line with the search service's TARGET_LAG: refresh the stage directory
+-- and ingest only when the refresh found new or changed files, or when files left
+-- pending by an earlier failure still have attempts left (MAX_ATTEMPTS defaults to 3)
+CREATE OR REPLACE TASK INGEST_CALL_RECORDINGS_TASK
+  WAREHOUSE = HC_AISQL_WH
+  SCHEDULE = '60 MINUTE'
+AS
+BEGIN
+  ALTER STAGE HC_AISQL_STAGE REFRESH;
+  LET pending INT := (
+    SELECT COUNT(*) FROM CALL_RECORDINGS_STATE WHERE STATUS <> 'DONE' AND ATTEMPTS < 3
+  );
+  IF (SYSTEM$STREAM_HAS_DATA('CALL_RECORDINGS_FILES_STREAM') OR pending > 0) THEN
+    CALL INGEST_CALL_RECORDINGS();
+    CALL EXTRACT_CALL_INSIGHTS();
+    CALL REBUILD_TRANSCRIPT_CHUNKS();
+  END IF;
+END;
+
+ALTER TASK INGEST_CALL_RECORDINGS_TASK RESUME;
+
+-- Initial load of the recordings already in the stage
+CALL INGEST_CALL_RECORDINGS();
+
+SELECT * FROM CALL_RECORDINGS_STATE;
 
 DESCRIBE TABLE CALL_RECORDINGS;
 
 SELECT * FROM CALL_RECORDINGS;
 
--- Create table to store extracted insights
-CREATE OR REPLACE TABLE CALL_INSIGHTS (
+/*
+Structured insights per transcript
+- the fields to extract are declared in CALL_INSIGHT_FIELDS; adding a row adds a column to CALL_INSIGHTS on the next run,
+- EXTRACT_CALL_INSIGHTS pulls all fields in one AI_COMPLETE call per transcript, with a JSON schema built from the declared fields as response_format,
+- results are merged on AUDIO_FILE_NAME, and only transcripts that are new, changed (MD5) or extracted with an older field list are sent to the model.
+*/
+CREATE TABLE IF NOT EXISTS CALL_INSIGHT_FIELDS (
+  FIELD_NAME STRING, -- column name in CALL_INSIGHTS
+  FIELD_TYPE STRING, -- JSON schema type: string, number, boolean or array
+  DESCRIPTION STRING -- what the model should extract
+);
+
+-- Default fields, only on the first run so that declared fields are kept
+INSERT INTO CALL_INSIGHT_FIELDS
+SELECT * FROM VALUES
+  ('CUSTOMER_NAME', 'string', 'The customer''s name'),
+  ('MEMBER_ID', 'string', 'The member ID'),
+  ('INQUIRY_TYPE', 'string', 'The purpose of the call'),
+  ('RESOLUTION', 'string', 'The resolution offered to the customer')
+WHERE NOT EXISTS (SELECT 1 FROM CALL_INSIGHT_FIELDS);
+
+-- Create table to store extracted insights; one column per declared field is added by EXTRACT_CALL_INSIGHTS
+CREATE TABLE IF NOT EXISTS CALL_INSIGHTS (
   AUDIO_FILE_NAME TEXT,
-  CUSTOMER_NAME arraY,
-  MEMBER_ID ARRAY,
-  INQUIRY_TYPE ARRAY,
-  RESOLUTION ARRAY
+  MD5 STRING, -- of the recording the insights were extracted from
+  FIELDS_HASH STRING, -- of the field list the insights were extracted with
+  EXTRACTED_AT TIMESTAMP_LTZ
 );
 
--- Insert structured insights from all transcripts into reporting table
-INSERT INTO CALL_INSIGHTS
-SELECT
-  REGEXP_SUBSTR(FL_GET_RELATIVE_PATH(AUDIO_FILE), '[^/]+$') AS AUDIO_FILE_NAME,
-  SNOWFLAKE.CORTEX.EXTRACT_ANSWER(CALL_TRANSCRIPT, 'What is the customer''s name?') AS CUSTOMER_NAME,
-  SNOWFLAKE.CORTEX.EXTRACT_ANSWER(CALL_TRANSCRIPT, 'What is the member ID?') AS MEMBER_ID,
-  SNOWFLAKE.CORTEX.EXTRACT_ANSWER(CALL_TRANSCRIPT, 'What is the purpose of the call?') AS INQUIRY_TYPE,
-  SNOWFLAKE.CORTEX.EXTRACT_ANSWER(CALL_TRANSCRIPT, 'What resolution was offered to the customer?') AS RESOLUTION,
-FROM CALL_RECORDINGS;
+CREATE OR REPLACE PROCEDURE EXTRACT_CALL_INSIGHTS(MODEL STRING DEFAULT 'llama3.3-70b')
+returns string
+language python
+runtime_version = '3.11'
+packages = ('snowflake-snowpark-python')
+handler = 'extract'
+as
+$$
+import hashlib
+import json
+
+COLUMN_TYPES = {"string": "STRING", "number": "FLOAT", "boolean": "BOOLEAN", "array": "ARRAY"}
+
+
+def sql_literal(value):
+    """Render a JSON value as a Snowflake constant, as response_format must be constant."""
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{sql_literal(k)}: {sql_literal(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, list):
+        return "[" + ", ".join(sql_literal(v) for v in value) + "]"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def extract(session, model):
+    fields = session.sql(
+        "SELECT FIELD_NAME, FIELD_TYPE, DESCRIPTION FROM CALL_INSIGHT_FIELDS ORDER BY FIELD_NAME"
+    ).collect()
+    fields_hash = hashlib.md5(json.dumps([list(f) for f in fields]).encode()).hexdigest()
+    for f in fields:
+        session.sql(
+            f"ALTER TABLE CALL_INSIGHTS ADD COLUMN IF NOT EXISTS {f['FIELD_NAME']} "
+            f"{COLUMN_TYPES[f['FIELD_TYPE']]}"
+        ).collect()
+
+    schema = {
+        "type": "json",
+        "schema": {
+            "type": "object",
+            # Nullable, so that fields the call does not mention are left empty
+            "properties": {
+                f["FIELD_NAME"]: {"type": [f["FIELD_TYPE"], "null"], "description": f["DESCRIPTION"]}
+                for f in fields
+            },
+            "required": [f["FIELD_NAME"] for f in fields],
+        },
+    }
+    prompt = (
+        "Extract the following fields from this health insurance call center transcript. "
+        "Use null for a field the call does not mention.\n"
+        + "".join(f"- {f['FIELD_NAME']}: {f['DESCRIPTION']}\n" for f in fields)
+        + "\nTranscript:\n"
+    )
+    columns = [f["FIELD_NAME"] for f in fields]
+    values = [f"s.INSIGHTS:{c}::{COLUMN_TYPES[f['FIELD_TYPE']]}" for c, f in zip(columns, fields)]
+
+    result = session.sql(f"""
+MERGE INTO CALL_INSIGHTS t
+USING (
+  SELECT AUDIO_FILE_NAME, MD5,
+    AI_COMPLETE(
+      model => {sql_literal(model)},
+      prompt => {sql_literal(prompt)} || CALL_TRANSCRIPT,
+      response_format => {sql_literal(schema)}
+    ) AS INSIGHTS
+  FROM (
+    SELECT REGEXP_SUBSTR(RELATIVE_PATH, '[^/]+$') AS AUDIO_FILE_NAME, MD5, CALL_TRANSCRIPT
+    FROM CALL_RECORDINGS
+    WHERE CALL_TRANSCRIPT IS NOT NULL
+  ) r
+  WHERE NOT EXISTS (
+    SELECT 1 FROM CALL_INSIGHTS i
+    WHERE i.AUDIO_FILE_NAME = r.AUDIO_FILE_NAME AND i.MD5 = r.MD5 AND i.FIELDS_HASH = ?
+  )
+) s
+ON t.AUDIO_FILE_NAME = s.AUDIO_FILE_NAME
+WHEN MATCHED THEN UPDATE SET
+  MD5 = s.MD5, FIELDS_HASH = ?, EXTRACTED_AT = CURRENT_TIMESTAMP(),
+  {", ".join(f"{c} = {v}" for c, v in zip(columns, values))}
+WHEN NOT MATCHED THEN INSERT (AUDIO_FILE_NAME, MD5, FIELDS_HASH, EXTRACTED_AT, {", ".join(columns)})
+  VALUES (s.AUDIO_FILE_NAME, s.MD5, ?, CURRENT_TIMESTAMP(), {", ".join(values)})
+""", params=[fields_hash, fields_hash, fields_hash]).collect()
+    row = result[0]
+    return f"Extracted insights from {row[0] + row[1]} transcripts ({row[0]} new)"
+$$;
+
+-- Extract structured insights from all transcripts into reporting table
+CALL EXTRACT_CALL_INSIGHTS();
 
 SELECT * FROM CALL_INSIGHTS;
 
+/*
+Transcript chunking
+- CHUNK_TRANSCRIPT splits a transcript into chunks of at most MAX_TOKENS (whitespace-separated words), each overlapping the previous one by up to OVERLAP_TOKENS,
+- chunks end at speaker turns where possible, falling back to sentences and then words for turns that do not fit,
+- each chunk keeps its file and character offsets in the transcript, and only transcripts that are new or changed (MD5), or were chunked with other MAX_TOKENS/OVERLAP_TOKENS, are chunked again.
+*/
+CREATE OR REPLACE FUNCTION CHUNK_TRANSCRIPT(TRANSCRIPT STRING, MAX_TOKENS INT, OVERLAP_TOKENS INT)
+returns table (CHUNK_INDEX INT, START_OFFSET INT, END_OFFSET INT, CHUNK_TEXT STRING)
+language python
+runtime_version = '3.11'
+handler = 'TranscriptChunker'
+as
+$$
+import re
+
+# A speaker turn starts at a line beginning with a short label followed by a colon,
+# or at a common call center speaker label anywhere in the text
+TURN_START = re.compile(
+    r"(?:^|(?<=\n))[^\S\n]*[A-Z][\w .'-]{0,30}:(?=\s)"
+    r"|\b(?:Agent|Customer|Caller|Member|Representative|Speaker \d+):"
+)
+SENTENCE = re.compile(r"[^.?!\n]+(?:[.?!]+|\n|$)")
+WORD = re.compile(r"\S+")
+
+
+def spans(pattern, text, start, end):
+    """Split text[start:end] at the matches of a boundary pattern."""
+    bounds = [m.start() for m in pattern.finditer(text, start, end) if m.start() > start]
+    return list(zip([start] + bounds, bounds + [end]))
+
+
+def count_tokens(text, start, end):
+    # Whitespace-separated words approximate model tokens closely enough for sizing
+    return len(WORD.findall(text, start, end))
+
+
+def units(text, max_tokens):
+    """Speaker turns, with turns longer than max_tokens split into sentences and
+    sentences longer than max_tokens split into words."""
+    for start, end in spans(TURN_START, text, 0, len(text)):
+        if count_tokens(text, start, end) <= max_tokens:
+            yield start, end
+            continue
+        for s_start, s_end in [(m.start(), m.end()) for m in SENTENCE.finditer(text, start, end)]:
+            if count_tokens(text, s_start, s_end) <= max_tokens:
+                yield s_start, s_end
+                continue
+            words = [(m.start(), m.end()) for m in WORD.finditer(text, s_start, s_end)]
+            for i in range(0, len(words), max_tokens):
+                yield words[i][0], words[min(i + max_tokens, len(words)) - 1][1]
+
+
+def carried(text, chunk, overlap_tokens):
+    """The units at the end of a chunk that fit in overlap_tokens, preceded by the
+    last words of the next unit back, so long turns and sentences overlap too."""
+    kept, budget = [], overlap_tokens
+    for start, end, tokens in reversed(chunk):
+        if tokens > budget:
+            if budget > 0:
+                words = [m.start() for m in WORD.finditer(text, start, end)]
+                kept.insert(0, (words[-budget], end, budget))
+            break
+        kept.insert(0, (start, end, tokens))
+        budget -= tokens
+    return kept
+
+
+def chunk_spans(text, max_tokens, overlap_tokens):
+    """Pack units into chunks of at most max_tokens, each starting with up to
+    overlap_tokens of the previous chunk's end: its last whole units, then the
+    last words of the unit before them when it does not fit whole. Units are at
+    most max_tokens - overlap_tokens long, so the overlap always fits."""
+    current = []  # (start, end, tokens)
+    for start, end in units(text, max(max_tokens - overlap_tokens, 1)):
+        tokens = count_tokens(text, start, end)
+        if not tokens:
+            continue
+        if current and sum(u[2] for u in current) + tokens > max_tokens:
+            yield current[0][0], current[-1][1]
+            current = carried(text, current, min(overlap_tokens, max_tokens - tokens))
+        current.append((start, end, tokens))
+    if current:
+        yield current[0][0], current[-1][1]
+
+
+class TranscriptChunker:
+    def process(self, transcript, max_tokens, overlap_tokens):
+        if not transcript:
+            return
+        for index, (start, end) in enumerate(chunk_spans(transcript, max_tokens, overlap_tokens)):
+            yield index, start, end, transcript[start:end].strip()
+$$;
+
+CREATE TABLE IF NOT EXISTS CALL_TRANSCRIPT_CHUNKS (
+  RELATIVE_PATH STRING,
+  MD5 STRING, -- of the recording the transcript was chunked from
+  CHUNK_INDEX INT,
+  START_OFFSET INT,
+  END_OFFSET INT,
+  CHUNK_TEXT STRING,
+  MAX_TOKENS INT, -- chunking parameters the transcript was chunked with
+  OVERLAP_TOKENS INT
+);
+-- Tables created before the chunking parameters were recorded
+ALTER TABLE CALL_TRANSCRIPT_CHUNKS ADD COLUMN IF NOT EXISTS MAX_TOKENS INT;
+ALTER TABLE CALL_TRANSCRIPT_CHUNKS ADD COLUMN IF NOT EXISTS OVERLAP_TOKENS INT;
+
+CREATE OR REPLACE PROCEDURE REBUILD_TRANSCRIPT_CHUNKS(
+  MAX_TOKENS INT DEFAULT 256,
+  OVERLAP_TOKENS INT DEFAULT 48
+)
+returns string
+language sql
+as
+BEGIN
+  -- Drop chunks of recordings that were removed or transcribed again, and chunks
+  -- made with other chunking parameters
+  DELETE FROM CALL_TRANSCRIPT_CHUNKS c
+  WHERE c.MAX_TOKENS IS DISTINCT FROM :MAX_TOKENS
+    OR c.OVERLAP_TOKENS IS DISTINCT FROM :OVERLAP_TOKENS
+    OR NOT EXISTS (
+      SELECT 1 FROM CALL_RECORDINGS r
+      WHERE r.RELATIVE_PATH = c.RELATIVE_PATH AND r.MD5 = c.MD5 AND r.CALL_TRANSCRIPT IS NOT NULL
+    );
+  INSERT INTO CALL_TRANSCRIPT_CHUNKS
+  SELECT r.RELATIVE_PATH, r.MD5, t.CHUNK_INDEX, t.START_OFFSET, t.END_OFFSET, t.CHUNK_TEXT,
+    :MAX_TOKENS, :OVERLAP_TOKENS
+  FROM CALL_RECORDINGS r,
+    TABLE(CHUNK_TRANSCRIPT(r.CALL_TRANSCRIPT, :MAX_TOKENS, :OVERLAP_TOKENS)) t
+  WHERE r.CALL_TRANSCRIPT IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM CALL_TRANSCRIPT_CHUNKS c WHERE c.RELATIVE_PATH = r.RELATIVE_PATH);
+  RETURN 'Inserted ' || SQLROWCOUNT || ' transcript chunks';
+END;
+
+CALL REBUILD_TRANSCRIPT_CHUNKS();
+
+SELECT * FROM CALL_TRANSCRIPT_CHUNKS ORDER BY RELATIVE_PATH, CHUNK_INDEX;
+
 /* 
 Create Cortex Search Service
 - the semantic search engine in Snowflake that uses vector embeddings + indexed retrieval, used here to find relevant transcrips for a natural language query.
@@ -67,6 +475,7 @@ Create Cortex Search Service
 - also provides indexing embeddings for fast semantic search and retrieval.
 - given trascript chunks as input data, computes embeddings, and builds an internal vector index. 
 - when a user submits a semantic query, its embedding is compared to the index - by Snowflake - to find the closest matches.
+- indexes the chunks of CALL_TRANSCRIPT_CHUNKS rather than whole transcripts, so matches and the context passed to EXTRACT_ANSWER stay small.
 */
 CREATE OR REPLACE CORTEX SEARCH SERVICE CALL_RECORDINGS_SEARCH
 ON CHUNK -- the column searched for matches when the service is queried
@@ -76,8 +485,11 @@ TARGET_LAG = '1 hour' -- automatic re-indexing to reflect the latest data in the
 AS (
   SELECT    
     REGEXP_SUBSTR(RELATIVE_PATH, '[^/]+$') AS RELATIVE_PATH,
-    'Audio File Name: ' || RELATIVE_PATH || ': Transcript - ' || CALL_TRANSCRIPT AS CHUNK
-  FROM CALL_RECORDINGS
+    CHUNK_INDEX,
+    START_OFFSET,
+    END_OFFSET,
+    'Audio File Name: ' || RELATIVE_PATH || ': Transcript - ' || CHUNK_TEXT AS CHUNK
+  FROM CALL_TRANSCRIPT_CHUNKS
 );
 
 /*
@@ -0,0 +1,122 @@
+# Local hybrid retrieval over call transcript chunks:
+# a BM25 inverted index, an optional dense vector index and reciprocal-rank fusion.
+# HybridSearch.search returns the same columns as the SEARCH_PREVIEW client, so it
+# can stand in for CALL_RECORDINGS_SEARCH, and rerank re-orders that client's results.
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can did do for from has have how i in is it me my of on "
+    "or that the this to was were what when which who why with you your".split()
+)
+RRF_K = 60  # dampens the weight of top ranks in reciprocal-rank fusion
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Inverted index scoring documents with Okapi BM25."""
+
+    def __init__(self, texts, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(document, term frequency)]
+        self.lengths = []
+        for document, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self.postings[term].append((document, frequency))
+        count = len(self.lengths)
+        self.average_length = sum(self.lengths) / count if count else 0
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def scores(self, query):
+        """Return the BM25 score of every document sharing a term with the query."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            for document, frequency in self.postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self.lengths[document] / self.average_length
+                scores[document] += (
+                    self.idf[term] * frequency * (self.k1 + 1)
+                    / (frequency + self.k1 * length_norm)
+                )
+        return scores
+
+
+def normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class DenseIndex:
+    """Cosine similarity over embeddings from `embed`, a function mapping a list
+    of texts to a list of vectors."""
+
+    def __init__(self, texts, embed):
+        self.embed = embed
+        self.vectors = [normalize(vector) for vector in embed(list(texts))] if texts else []
+
+    def scores(self, query):
+        query_vector = normalize(self.embed([query])[0])
+        return {
+            document: sum(q * d for q, d in zip(query_vector, vector))
+            for document, vector in enumerate(self.vectors)
+        }
+
+
+def rank(scores):
+    """Document ids ordered from best to worst score."""
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse rankings by summing 1 / (k + rank) per document, best first."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for position, document in enumerate(ranking):
+            fused[document] += 1 / (k + position + 1)
+    return rank(fused)
+
+
+class HybridSearch:
+    """
+    Hybrid retrieval over a DataFrame of chunks, one row per chunk with its text in
+    `text_column` and any attributes (file name, offsets) in the other columns.
+    A dense index is added when `embed` is given.
+    """
+
+    def __init__(self, chunks, text_column="CHUNK", embed=None):
+        self.chunks = chunks.reset_index(drop=True)
+        texts = self.chunks[text_column].tolist()
+        self.bm25 = BM25Index(texts)
+        self.dense = DenseIndex(texts, embed) if embed is not None else None
+
+    def rankings(self, query):
+        rankings = [rank(self.bm25.scores(query))]
+        if self.dense is not None:
+            rankings.append(rank(self.dense.scores(query)))
+        return rankings
+
+    def search(self, query, limit):
+        """Return the `limit` best chunks for the query, best first."""
+        documents = reciprocal_rank_fusion(self.rankings(query))[:limit]
+        return self.chunks.iloc[documents].reset_index(drop=True)
+
+
+def rerank(query, results, text_column="CHUNK", embed=None):
+    """Re-order results of another retriever, best first, by fusing their original
+    order with local BM25 (and dense) rankings computed over the results alone."""
+    if len(results) < 2:
+        return results
+    local = HybridSearch(results, text_column, embed)
+    original = list(range(len(results)))
+    documents = reciprocal_rank_fusion([original] + local.rankings(query))
+    return local.chunks.iloc[documents].reset_index(drop=True)
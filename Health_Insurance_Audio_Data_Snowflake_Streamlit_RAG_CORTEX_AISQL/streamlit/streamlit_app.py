@@ -1,10 +1,213 @@
 # Import python packages
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import json
+import threading
+import pandas as pd
+from hybrid_search import HybridSearch, rerank
 
 session = get_active_session()
 
+SEARCH_SERVICE = "CALL_RECORDINGS_SEARCH"
+SEARCH_LIMIT = 2  # transcript chunks retrieved per question by default
+SEARCH_MAX_LIMIT = 10  # upper bound for the configurable and adaptive limit
+ADAPTIVE_MIN_CONFIDENCE = 0.5  # below this best score, adaptive top-k retrieves more chunks
+EXTRACT_MAX_WORKERS = 4  # EXTRACT_ANSWER calls run concurrently
+ANSWER_CACHE_MAX_ENTRIES = 10_000  # extracted answers kept, shared by all users
+RERANK_CANDIDATES = 3  # Cortex Search results fetched per chunk kept after local re-ranking
+EMBED_MODEL = "snowflake-arctic-embed-m-v1.5"  # dense vectors of the local engine
+EMBED_BATCH_SIZE = 500  # texts embedded per statement
+ENGINES = ["Cortex Search", "Cortex Search + local re-rank", "Local hybrid index"]
+# Matches TARGET_LAG of CALL_RECORDINGS_SEARCH: the index cannot change faster than this
+SEARCH_CACHE_TTL = 60 * 60  # in seconds
+
+# Retrieval and extraction run as fixed statements with bind parameters, so
+# questions never change the SQL text and quotes in them are harmless
+SEARCH_SQL = """
+SELECT
+  value:CHUNK::STRING AS chunk,
+  value:RELATIVE_PATH::STRING AS file_name,
+  value:START_OFFSET::INT AS start_offset,
+  value:END_OFFSET::INT AS end_offset
+FROM TABLE(FLATTEN(input => PARSE_JSON(
+  SNOWFLAKE.CORTEX.SEARCH_PREVIEW(?, ?)
+)['results']))
+"""
+
+EXTRACT_SQL = """
+SELECT
+  value:answer::STRING AS answer,
+  value:score::FLOAT AS confidence_score
+FROM TABLE(FLATTEN(input => SNOWFLAKE.CORTEX.EXTRACT_ANSWER(?, ?)))
+"""
+
+# The chunks indexed by CALL_RECORDINGS_SEARCH, with the same columns it returns
+LOCAL_CHUNKS_SQL = """
+SELECT
+  'Audio File Name: ' || RELATIVE_PATH || ': Transcript - ' || CHUNK_TEXT AS chunk,
+  REGEXP_SUBSTR(RELATIVE_PATH, '[^/]+$') AS file_name,
+  start_offset,
+  end_offset
+FROM CALL_TRANSCRIPT_CHUNKS
+"""
+
+EMBED_SQL = """
+SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, value::STRING)::ARRAY AS embedding
+FROM TABLE(FLATTEN(input => PARSE_JSON(?)))
+ORDER BY index
+"""
+
+
+def normalize_question(question):
+    """Lowercase a question and drop surrounding punctuation and extra spaces,
+    so near-identical questions share cached searches and answers."""
+    return " ".join(question.lower().split()).strip(" ?!.")
+
+
+def build_search_body(question, limit):
+    """JSON input for SEARCH_PREVIEW."""
+    return json.dumps({
+        "query": question,
+        "columns": ["CHUNK", "RELATIVE_PATH", "START_OFFSET", "END_OFFSET"],
+        "limit": limit
+    })
+
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner=False)
+def search_chunks(question, limit):
+    """Retrieve the transcript chunks most relevant to a normalized question."""
+    return session.sql(
+        SEARCH_SQL, params=[SEARCH_SERVICE, build_search_body(question, limit)]
+    ).to_pandas()
+
+
+def embed_texts(texts):
+    """Embed texts in Snowflake, for the dense index of the local engine."""
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        rows = session.sql(
+            EMBED_SQL, params=[EMBED_MODEL, json.dumps(texts[i:i + EMBED_BATCH_SIZE])]
+        ).collect()
+        vectors += [json.loads(row["EMBEDDING"]) for row in rows]
+    return vectors
+
+
+@st.cache_resource(ttl=SEARCH_CACHE_TTL, show_spinner="Building local search index...")
+def get_local_index(dense):
+    """BM25 (and dense) index over the same chunks as CALL_RECORDINGS_SEARCH."""
+    chunks = session.sql(LOCAL_CHUNKS_SQL).to_pandas()
+    return HybridSearch(chunks, embed=embed_texts if dense else None)
+
+
+def retrieve(question, limit, engine, dense):
+    """Retrieve the chunks most relevant to a normalized question with the chosen engine."""
+    if engine == "Local hybrid index":
+        return get_local_index(dense).search(question, limit)
+    if engine == "Cortex Search + local re-rank":
+        candidates = search_chunks(question, limit * RERANK_CANDIDATES)
+        return rerank(question, candidates, embed=embed_texts if dense else None).head(limit)
+    return search_chunks(question, limit)
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+@st.cache_resource
+def get_answer_cache():
+    """Extracted answers per (chunk hash, question), least recently used evicted first."""
+    return OrderedDict()
+
+
+@st.cache_resource
+def get_answer_cache_lock():
+    """Guards the answer cache, which every user's script thread reads and updates."""
+    return threading.Lock()
+
+
+@st.cache_resource
+def get_extract_executor():
+    return ThreadPoolExecutor(max_workers=EXTRACT_MAX_WORKERS)
+
+
+def run_extract_answer(chunk, question):
+    """Run EXTRACT_ANSWER on one chunk. Called from worker threads, so it must not
+    use any Streamlit API."""
+    return session.sql(EXTRACT_SQL, params=[chunk, question]).to_pandas()
+
+
+def lookup_answers(key):
+    cache = get_answer_cache()
+    with get_answer_cache_lock():
+        answers = cache.get(key)
+        if answers is not None:
+            cache.move_to_end(key)
+    return answers
+
+
+def store_answers(key, answers):
+    cache = get_answer_cache()
+    with get_answer_cache_lock():
+        cache[key] = answers
+        cache.move_to_end(key)
+        while len(cache) > ANSWER_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def show_answers(placeholder, answers):
+    """Fill a match's answer placeholder with its answers, best first."""
+    with placeholder.container():
+        if answers.empty:
+            st.markdown("**🧠 Extracted Answer:** _No answer found in this chunk_")
+        for _, answer in answers.sort_values("CONFIDENCE_SCORE", ascending=False).iterrows():
+            st.markdown(f"**🧠 Extracted Answer:** {answer['ANSWER']}")
+            st.markdown(f"🔢 Confidence Score: `{round(answer['CONFIDENCE_SCORE'], 3)}`")
+
+
+def show_matches(chunks, first_match, question):
+    """
+    Render retrieved chunks right away, then extract their answers concurrently
+    and fill each one in as it completes.
+
+    Returns the extracted answers of all chunks with their file names.
+    """
+    placeholders = {}
+    results = []
+    for index, row in chunks.iterrows():
+        st.markdown(f"**Match:** `{first_match + index + 1}`")
+        st.markdown(
+            f"**📁 File:** `{row['FILE_NAME']}` · transcript characters "
+            f"`{row['START_OFFSET']}–{row['END_OFFSET']}`"
+        )
+        placeholders[index] = st.empty()
+        with st.expander("🗒️ Matched Transcript Chunk"):
+            st.write(row['CHUNK'])
+        st.divider()
+
+    futures = {}
+    for index, row in chunks.iterrows():
+        key = (chunk_hash(row["CHUNK"]), question)
+        answers = lookup_answers(key)
+        if answers is not None:
+            show_answers(placeholders[index], answers)
+            results.append(answers.assign(FILE_NAME=row["FILE_NAME"]))
+        else:
+            placeholders[index].info("⏳ Extracting answer...")
+            future = get_extract_executor().submit(run_extract_answer, row["CHUNK"], question)
+            futures[future] = (index, key)
+
+    for future in as_completed(futures):
+        index, key = futures[future]
+        answers = future.result()
+        store_answers(key, answers)
+        show_answers(placeholders[index], answers)
+        results.append(answers.assign(FILE_NAME=chunks.loc[index, "FILE_NAME"]))
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
 st.set_page_config(page_title="📞 Health Insurance Call Center AI Assistant", layout="wide")
 
 st.title("📞 Health Insurance Call Center AI Assistant")
@@ -38,56 +241,29 @@ This app runs a **Retrieval-Augmented Generation (RAG)** workflow entirely withi
 
 All processing happens **natively inside Snowflake**, ensuring simplicity, scalability, and data security.
 """)
+    st.markdown("## ⚙️ Retrieval Settings")
+    search_limit = st.slider(
+        "Transcript chunks to retrieve", 1, SEARCH_MAX_LIMIT, SEARCH_LIMIT
+    )
+    adaptive_top_k = st.toggle(
+        "Adaptive top-k", value=True,
+        help=f"Retrieve more chunks, up to {SEARCH_MAX_LIMIT}, while no answer "
+             f"reaches a confidence of {ADAPTIVE_MIN_CONFIDENCE}"
+    )
+    engine = st.radio(
+        "Retrieval engine", ENGINES,
+        help="The local engine fuses BM25 (and dense) rankings with reciprocal-rank "
+             "fusion, over the indexed chunks or over the Cortex Search results"
+    )
+    dense_vectors = engine != ENGINES[0] and st.toggle(
+        "Dense vectors", value=False,
+        help=f"Add {EMBED_MODEL} embeddings to the local rankings"
+    )
 
 # Run only if question provided
 if user_question:  
-    # JSON input for SEARCH_PREVIEW
-    search_body = json.dumps({
-        "query": user_question,
-        "columns": ["CHUNK", "RELATIVE_PATH"],
-        "limit": 2
-    })
-
-    # SQL query with parameterized question
-    sql = f"""
-    WITH preview AS (
-      SELECT PARSE_JSON(
-        SNOWFLAKE.CORTEX.SEARCH_PREVIEW(
-          'CALL_RECORDINGS_SEARCH',          
-          '{search_body}'
-        )
-      )['results'] AS results
-    ),
-    flattened AS (
-      SELECT 
-        value:CHUNK::STRING AS chunk,
-        value:RELATIVE_PATH::STRING AS file_name
-      FROM preview,
-      LATERAL FLATTEN(input => results)
-    ),
-    extracted AS (
-      SELECT 
-        file_name,
-        chunk,
-        SNOWFLAKE.CORTEX.EXTRACT_ANSWER(chunk, '{user_question}') AS extracted_answer
-      FROM flattened
-    ),
-    answers AS (
-      SELECT
-        file_name,
-        chunk,
-        value:answer::STRING AS answer,
-        value:score::FLOAT AS confidence_score
-      FROM extracted,
-      LATERAL FLATTEN(input => extracted_answer)
-    )
-    SELECT * FROM answers
-    ORDER BY confidence_score DESC;
-    """
-
-    # Run the query using Snowpark session
-    
-    df = session.sql(sql).to_pandas()        
+    question = normalize_question(user_question)
+    search_body = build_search_body(question, search_limit)
 
     # RAG pipeline steps
     st.subheader("🧩 RAG Pipeline Execution")
@@ -97,30 +273,53 @@ if user_question:
     st.code(user_question, language='markdown')
 
     # Step 2: Search payload sent to SEARCH_PREVIEW and
-    # the full SQL query executed to perform the RAG Pipeline
+    # the SQL executed to perform the RAG Pipeline
     st.markdown("#### 2️⃣ Search Payload and SQL Used")
     with st.expander("🔧 Cortex SEARCH_PREVIEW Payload"):
+        if engine == "Local hybrid index":
+            st.caption("Not used: chunks are retrieved from the local hybrid index")
         st.json(json.loads(search_body))
 
-    with st.expander("🧾 Full SQL Executed (RAG Pipeline)"):
-        st.code(sql, language='sql')
+    with st.expander("🧾 SQL Executed (RAG Pipeline)"):
+        st.markdown("Retrieval, bound to the service name and payload:")
+        st.code(SEARCH_SQL, language='sql')
+        st.markdown("Extraction, bound to each chunk and the question:")
+        st.code(EXTRACT_SQL, language='sql')
 
-    # Step 3: Results
-    if df.empty:
+    # Step 3: Results. Retrieved chunks are shown as soon as the search returns,
+    # and answers are extracted from them concurrently. With adaptive top-k, the
+    # limit doubles while no answer is confident enough and the index has more.
+    with st.spinner("Searching transcripts..."):
+        chunks = retrieve(question, search_limit, engine, dense_vectors)
+    if chunks.empty:
         st.warning("❌ No relevant answers found.")
     else:
         st.markdown("#### 3️⃣ Top Matched Transcript Chunks + Generated Answers")
-        for index, row in df.iterrows():
-            st.markdown(f"**Match:** `{index + 1}`")
-            st.markdown(f"**📁 File:** `{row['FILE_NAME']}`")
-            st.markdown(f"**🧠 Extracted Answer:** {row['ANSWER']}")
-            st.markdown(f"🔢 Confidence Score: `{round(row['CONFIDENCE_SCORE'], 3)}`")
-            with st.expander("🗒️ Matched Transcript Chunk"):
-                st.write(row['CHUNK'])
-            st.divider()
-    
-  
-
-    
-    
+        answers = show_matches(chunks, 0, question)
+        shown = set(chunks["CHUNK"])
+        limit = search_limit
+        while (
+            adaptive_top_k
+            and (answers.empty or answers["CONFIDENCE_SCORE"].max() < ADAPTIVE_MIN_CONFIDENCE)
+            and len(chunks) == limit
+            and limit < SEARCH_MAX_LIMIT
+        ):
+            limit = min(limit * 2, SEARCH_MAX_LIMIT)
+            st.caption(f"🔁 No confident answer yet, retrieving up to {limit} chunks")
+            with st.spinner("Searching transcripts..."):
+                chunks = retrieve(question, limit, engine, dense_vectors)
+            # Rankings of a larger limit need not extend the smaller one, so only
+            # chunks not shown yet are added
+            new_chunks = chunks[~chunks["CHUNK"].isin(shown)].reset_index(drop=True)
+            answers = pd.concat(
+                [answers, show_matches(new_chunks, len(shown), question)],
+                ignore_index=True,
+            )
+            shown |= set(new_chunks["CHUNK"])
 
+        if not answers.empty:
+            best = answers.loc[answers["CONFIDENCE_SCORE"].idxmax()]
+            st.success(
+                f"**🏆 Best Answer:** {best['ANSWER']}  \n"
+                f"📁 `{best['FILE_NAME']}` · 🔢 `{round(best['CONFIDENCE_SCORE'], 3)}`"
+            )
@@ -1,13 +1,13 @@
 USE ROLE ACCOUNTADMIN;
-CREATE OR REPLACE WAREHOUSE HC_AISQL_WH;
-CREATE OR REPLACE DATABASE HC_AISQL_DB;
-CREATE OR REPLACE SCHEMA HC_AISQL_DB.HC_AISQL_SCHEMA;
+CREATE WAREHOUSE IF NOT EXISTS HC_AISQL_WH;
+CREATE DATABASE IF NOT EXISTS HC_AISQL_DB;
+CREATE SCHEMA IF NOT EXISTS HC_AISQL_DB.HC_AISQL_SCHEMA;
 
 USE WAREHOUSE HC_AISQL_WH;
 USE DATABASE HC_AISQL_DB;
 USE SCHEMA HC_AISQL_SCHEMA;
 
-CREATE OR REPLACE STAGE HC_AISQL_STAGE 
+CREATE STAGE IF NOT EXISTS HC_AISQL_STAGE 
 	DIRECTORY = ( ENABLE = true ) 
 	ENCRYPTION = ( TYPE = 'SNOWFLAKE_SSE' );
 
@@ -51,21 +51,23 @@ AI_CLASSIFY(PROMPT('Please classify this medical image {0}', IMAGE_FILE),
         ['X-ray', 'CT', 'MRI', 'Ultrasound','PET','Other']):labels[0]::STRING as AI_CLASSIFY_CLASSIFICATION
 from MEDICAL_IMAGES;
 
--- Store AI classifications
-ALTER TABLE MEDICAL_IMAGES ADD COLUMN AI_COMPLETE_IMAGE_CLASSIFICATION STRING;
-
-UPDATE MEDICAL_IMAGES 
-SET AI_COMPLETE_IMAGE_CLASSIFICATION = AI_COMPLETE('claude-3-5-sonnet',
-PROMPT('Classify the input image {0} in no more than 2 words', IMAGE_FILE));
-
-ALTER TABLE MEDICAL_IMAGES ADD COLUMN AI_CLASSIFY_CLASSIFICATION STRING;
-
-UPDATE MEDICAL_IMAGES 
-SET AI_CLASSIFY_CLASSIFICATION = AI_CLASSIFY(PROMPT('Please classify this medical image {0}', IMAGE_FILE),
-        ['X-ray', 'CT', 'MRI', 'Ultrasound','PET','Other']):labels[0]::STRING;
-
 DESCRIBE TABLE MEDICAL_IMAGES;
 
+-- AI results read by the Streamlit app, computed at most once per image content (stage MD5, or ETAG),
+-- AI task, model and prompt version (a hash of the prompt text), see streamlit/image_inference.py.
+-- Classifications, explanations and diagnoses of every staged image are stored here in batches by
+-- run_batch_job (the app's Batch Processing tab), which only processes images without results yet,
+-- instead of updating every row of MEDICAL_IMAGES each time images are added.
+CREATE TABLE IF NOT EXISTS IMAGE_INFERENCE_RESULTS (
+  CONTENT_HASH STRING,
+  TASK STRING, -- CLASSIFICATION, EXPLANATION or DIAGNOSIS
+  MODEL STRING,
+  PROMPT_VERSION STRING,
+  RESULT STRING,
+  RELATIVE_PATH STRING, -- of the image the result was first computed for
+  CREATED_AT TIMESTAMP_LTZ
+);
+
 SELECT * FROM MEDICAL_IMAGES;
 
 
@@ -0,0 +1,209 @@
+# AI inference over medical images in the stage, computed at most once per image.
+# Results are stored in IMAGE_INFERENCE_RESULTS keyed on the image content hash
+# (stage MD5, or ETAG), the AI task, its model and the version of its prompt.
+import hashlib
+import json
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from snowflake.snowpark.exceptions import SnowparkSQLException
+from snowflake.snowpark.functions import call_function, col, current_timestamp, prompt
+
+RESULTS_TABLE = "HC_AISQL_DB.HC_AISQL_SCHEMA.IMAGE_INFERENCE_RESULTS"
+RESULT_COLUMNS = ["CONTENT_HASH", "TASK", "MODEL", "PROMPT_VERSION", "RESULT", "RELATIVE_PATH"]
+
+# Medical images in the stage, with the hash identifying their content
+IMAGES_SQL = """
+SELECT TO_FILE(FILE_URL) AS IMAGE_FILE,
+RELATIVE_PATH,
+COALESCE(MD5, ETAG) AS CONTENT_HASH
+FROM DIRECTORY(@HC_AISQL_DB.HC_AISQL_SCHEMA.HC_AISQL_STAGE)
+WHERE RELATIVE_PATH LIKE 'MEDICAL_IMAGES/%'
+"""
+
+COMPLETE_MODEL = "claude-3-5-sonnet"
+category_list = ['X-ray', 'CT', 'MRI', 'Ultrasound', 'PET', 'Other']
+CLASSIFY_PROMPT = "Please classify this medical image {0}"
+EXPLANATION_PROMPT = "Explain in one sentence why this is a valid classification for image {0}"
+DIAGNOSIS_PROMPT = "Provide a concise medical diagnosis based on this image {0}."
+
+
+def prompt_version(*parts):
+    """Version of a prompt, which changes whenever its text or categories change."""
+    return hashlib.md5(json.dumps(parts).encode("utf-8")).hexdigest()[:12]
+
+
+# Each AI task with its model, prompt version and Snowpark expression over IMAGE_FILE
+AI_TASKS = {
+    "CLASSIFICATION": {
+        "model": "AI_CLASSIFY",
+        "version": prompt_version(CLASSIFY_PROMPT, category_list),
+        "expr": call_function(
+            "AI_CLASSIFY",
+            prompt(CLASSIFY_PROMPT, col("IMAGE_FILE")),
+            category_list
+        )["labels"][0].cast("string"),
+    },
+    "EXPLANATION": {
+        "model": COMPLETE_MODEL,
+        "version": prompt_version(EXPLANATION_PROMPT),
+        "expr": call_function(
+            "AI_COMPLETE",
+            COMPLETE_MODEL,
+            prompt(EXPLANATION_PROMPT, col("IMAGE_FILE"))
+        ),
+    },
+    "DIAGNOSIS": {
+        "model": COMPLETE_MODEL,
+        "version": prompt_version(DIAGNOSIS_PROMPT),
+        "expr": call_function(
+            "AI_COMPLETE",
+            COMPLETE_MODEL,
+            prompt(DIAGNOSIS_PROMPT, col("IMAGE_FILE"))
+        ),
+    },
+}
+
+
+def staged_images(session):
+    """Snowpark DataFrame of the medical images in the stage."""
+    return session.sql(IMAGES_SQL)
+
+
+def read_results(session, content_hashes=None):
+    """Stored results as {content hash: {task: result}}, for the current model and
+    prompt version of each task only. Reads all images when no hashes are given."""
+    results_df = session.table(RESULTS_TABLE)
+    if content_hashes is not None:
+        results_df = results_df.filter(col("CONTENT_HASH").isin(list(content_hashes)))
+    rows = results_df.select("CONTENT_HASH", "TASK", "MODEL", "PROMPT_VERSION", "RESULT").collect()
+    results = {}
+    for row in rows:
+        task = AI_TASKS.get(row["TASK"])
+        if task and row["MODEL"] == task["model"] and row["PROMPT_VERSION"] == task["version"]:
+            results.setdefault(row["CONTENT_HASH"], {})[row["TASK"]] = row["RESULT"]
+    return results
+
+
+def run_tasks(session, images, task_names):
+    """
+    Run the given AI tasks over a DataFrame of staged images in a single query and
+    store one result row per image and task. Returns {content hash: {task: result}}.
+    """
+    rows = images.select(
+        "CONTENT_HASH", "RELATIVE_PATH",
+        *[AI_TASKS[name]["expr"].alias(name) for name in task_names]
+    ).collect()
+    records = [
+        (row["CONTENT_HASH"], name, AI_TASKS[name]["model"], AI_TASKS[name]["version"],
+         row[name], row["RELATIVE_PATH"])
+        for row in rows
+        for name in task_names
+        if row[name] is not None
+    ]
+    if records:
+        (
+            session.create_dataframe(records, schema=RESULT_COLUMNS)
+            .with_column("CREATED_AT", current_timestamp())
+            .write.mode("append")
+            .save_as_table(RESULTS_TABLE)
+        )
+    return {row["CONTENT_HASH"]: {name: row[name] for name in task_names} for row in rows}
+
+
+def get_results(session, relative_path, content_hash):
+    """Results of every AI task for one image, computing only those not stored yet."""
+    results = read_results(session, [content_hash]).get(content_hash, {})
+    missing = [name for name in AI_TASKS if name not in results]
+    if missing:
+        image = staged_images(session).filter(col("RELATIVE_PATH") == relative_path)
+        results.update(run_tasks(session, image, missing).get(content_hash, {}))
+    return results
+
+
+def pending_batches(session, batch_size):
+    """
+    Batches of (relative paths, missing tasks) covering every staged image with a
+    task not stored yet. Images with the same content are processed once, and each
+    batch holds images missing the same tasks so that no AI call is repeated.
+    """
+    stored = read_results(session)
+    by_tasks = defaultdict(list)
+    seen = set()
+    for row in staged_images(session).select("RELATIVE_PATH", "CONTENT_HASH").collect():
+        if row["CONTENT_HASH"] in seen:
+            continue
+        seen.add(row["CONTENT_HASH"])
+        missing = tuple(name for name in AI_TASKS if name not in stored.get(row["CONTENT_HASH"], {}))
+        if missing:
+            by_tasks[missing].append(row["RELATIVE_PATH"])
+    return [
+        (paths[i:i + batch_size], missing)
+        for missing, paths in by_tasks.items()
+        for i in range(0, len(paths), batch_size)
+    ]
+
+
+def run_batch_job(session, batch_size=20, max_concurrency=4, max_attempts=3, on_progress=None):
+    """
+    Classify, explain and diagnose every staged image missing a stored result, in
+    batches of `batch_size` images with up to `max_concurrency` batches running.
+
+    The job is resumable: progress is the results table itself, so running it again
+    after an interruption only processes the images still missing results. A failed
+    batch is retried image by image, each up to `max_attempts` times.
+    `on_progress(done, total)` is called from the calling thread after each batch.
+
+    Returns (images processed, images failed).
+    """
+    queue = deque(pending_batches(session, batch_size))
+    total = sum(len(paths) for paths, _ in queue)
+    attempts = defaultdict(int)
+    done = failed = 0
+
+    def run(paths, missing):
+        images = staged_images(session).filter(col("RELATIVE_PATH").isin(paths))
+        return run_tasks(session, images, list(missing))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        running = {}
+        while queue or running:
+            while queue and len(running) < max_concurrency:
+                paths, missing = queue.popleft()
+                running[executor.submit(run, paths, missing)] = (paths, missing)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                paths, missing = running.pop(future)
+                try:
+                    future.result()
+                    done += len(paths)
+                except SnowparkSQLException:
+                    if len(paths) > 1:
+                        # Retry image by image so one bad image does not block the batch
+                        queue.extend(([path], missing) for path in paths)
+                        continue
+                    attempts[paths[0]] += 1
+                    if attempts[paths[0]] < max_attempts:
+                        queue.append((paths, missing))
+                        continue
+                    failed += 1
+                if on_progress is not None:
+                    on_progress(done + failed, total)
+    return done, failed
+
+
+def results_overview(session):
+    """The latest stored result of each task per image, one row per image."""
+    return session.sql(f"""
+        SELECT *
+        FROM (
+            SELECT CONTENT_HASH,
+            MAX(RELATIVE_PATH) OVER (PARTITION BY CONTENT_HASH) AS RELATIVE_PATH,
+            TASK,
+            RESULT
+            FROM {RESULTS_TABLE}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY CONTENT_HASH, TASK ORDER BY CREATED_AT DESC) = 1
+        )
+        PIVOT (MAX(RESULT) FOR TASK IN ('CLASSIFICATION', 'EXPLANATION', 'DIAGNOSIS'))
+        ORDER BY RELATIVE_PATH
+    """)
@@ -1,10 +1,43 @@
 # Import python packages
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
-from snowflake.snowpark.functions import col, prompt, call_function
+import math
+import pandas as pd
+from image_inference import AI_TASKS, get_results, results_overview, run_batch_job, staged_images
+from thumbnails import ThumbnailCache, get_thumbnails, read_image
 
 session = get_active_session()
 
+IMAGE_INDEX_TTL = 300  # seconds before newly staged images show up in the picker
+PICKER_COLUMNS = 6
+PICKER_PAGE_SIZE = 18
+FULL_IMAGE_CACHE_ENTRIES = 20
+
+
+@st.cache_data(ttl=IMAGE_INDEX_TTL, show_spinner=False)
+def get_image_index():
+    """Path and content hash of every staged image, listed at most once per TTL."""
+    return staged_images(session).select("RELATIVE_PATH", "CONTENT_HASH").to_pandas()
+
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """Thumbnail cache shared by all sessions of the app."""
+    return ThumbnailCache()
+
+
+@st.cache_data(max_entries=FULL_IMAGE_CACHE_ENTRIES, show_spinner=False)
+def get_full_image(relative_path, content_hash):
+    """Full-resolution image, cached per content so a replaced file is read again."""
+    return read_image(session, relative_path)
+
+
+@st.cache_data(show_spinner=False)
+def get_inference_results(relative_path, content_hash):
+    """AI results of an image, computed once per image content and then read from
+    IMAGE_INFERENCE_RESULTS, and kept here so reruns run no query at all."""
+    return get_results(session, relative_path, content_hash)
+
 st.set_page_config(page_title="🧠 Medical Image Classifier", layout="wide")
 
 # Title and description
@@ -14,7 +47,7 @@ st.markdown("Classify medical images and provide a concise medical diagnosis usi
 # Step 1 - Upload or Select Image
 st.markdown("### 1️⃣ Upload or Select Medical Image")
 
-tab1, tab2 = st.tabs(["📁 Upload Image", "📦 Select from Stage"])
+tab1, tab2, tab3 = st.tabs(["📁 Upload Image", "📦 Select from Stage", "🗂️ Batch Processing"])
 
 with tab1:
     uploaded_file = st.file_uploader("Upload JPEG image", type=["jpg", "jpeg"])
@@ -28,6 +61,7 @@ with tab1:
         try:
             session.file.put_stream(uploaded_file, file_path_on_stage,
                              auto_compress=True, overwrite=True)
+            get_image_index.clear()
             st.success(f"File '{uploaded_file.name}' uploaded successfully to stage '{stage_name}' in the '{stage_folder}' folder.")
             st.info("Go to 'Select from Stage' tab. Select the uploaded image for AI classification and medical diagnosis")
         except Exception as e:
@@ -35,123 +69,153 @@ with tab1:
        
 
 with tab2:
-    df = session.sql("""
-        SELECT TO_FILE(FILE_URL) AS IMAGE_FILE,
-        RELATIVE_PATH
-        FROM DIRECTORY(@HC_AISQL_DB.HC_AISQL_SCHEMA.HC_AISQL_STAGE)
-        WHERE RELATIVE_PATH LIKE 'MEDICAL_IMAGES/%'
-        """)
-
-    selected_path = st.selectbox("", df.select(col("RELATIVE_PATH")))
-    
-    image = session.file.get_stream("@HC_AISQL_DB.HC_AISQL_SCHEMA.HC_AISQL_STAGE/" + selected_path, decompress=False).read()
-    st.image(image)
-
-    # Step 2 - Classification Results
-    st.markdown("### 2️⃣ AI Classification & Explanation using Cortex AISQL functions")
-
-    # Run AI_CLASSIFY
-    category_list = ['X-ray', 'CT', 'MRI', 'Ultrasound', 'PET', 'Other']
-    classify_expr = call_function(
+    images_df = get_image_index()
+
+    # Page through the images matching the filter, showing a thumbnail of each
+    name_filter = st.text_input("🔎 Filter by file name")
+    if name_filter:
+        images_df = images_df[images_df["RELATIVE_PATH"].str.contains(name_filter, case=False, regex=False)]
+    page_count = max(1, math.ceil(len(images_df) / PICKER_PAGE_SIZE))
+    page = st.number_input(f"Page (of {page_count}, {len(images_df)} images)", min_value=1, max_value=page_count, value=1)
+    page_df = images_df.iloc[(page - 1) * PICKER_PAGE_SIZE:page * PICKER_PAGE_SIZE]
+
+    thumbnails = get_thumbnails(
+        session, get_thumbnail_cache(),
+        list(zip(page_df["RELATIVE_PATH"], page_df["CONTENT_HASH"]))
+    )
+    columns = st.columns(PICKER_COLUMNS)
+    for i, (relative_path, image_hash) in enumerate(zip(page_df["RELATIVE_PATH"], page_df["CONTENT_HASH"])):
+        with columns[i % PICKER_COLUMNS]:
+            if thumbnails.get(image_hash):
+                st.image(thumbnails[image_hash], use_container_width=True)
+            if st.button(relative_path.split("/")[-1], key=f"select_{relative_path}", use_container_width=True):
+                st.session_state.selected_image = relative_path
+
+    # Keep the selection across pages. Nothing is selected by default, so AI
+    # functions only run on an image the user picked
+    selected_path = st.session_state.get("selected_image")
+    selected = images_df[images_df["RELATIVE_PATH"] == selected_path]
+
+    if images_df.empty:
+        st.info("No staged images match.")
+    elif selected.empty:
+        st.info("👆 Select an image to classify it and get an AI diagnosis.")
+    else:
+        selected_path, content_hash = selected.iloc[0][["RELATIVE_PATH", "CONTENT_HASH"]]
+        st.markdown(f"**Selected**: `{selected_path}`")
+        # Only download the full-resolution image when asked to
+        if st.toggle("🖼️ Show full resolution image"):
+            st.image(get_full_image(selected_path, content_hash))
+        else:
+            # The selection may be on another page than the one shown
+            if content_hash not in thumbnails:
+                thumbnails.update(get_thumbnails(session, get_thumbnail_cache(), [(selected_path, content_hash)]))
+            if thumbnails[content_hash]:
+                st.image(thumbnails[content_hash])
+
+        # Run AI_CLASSIFY, the AI_COMPLETE explanation and the AI_COMPLETE diagnosis
+        # in one query, only for those not stored yet for this image, model and prompt
+        with st.spinner("Running Cortex AISQL functions..."):
+            results = get_inference_results(selected_path, content_hash)
+
+        # Step 2 - Classification Results
+        st.markdown("### 2️⃣ AI Classification & Explanation using Cortex AISQL functions")
+
+        # Display results
+        if "CLASSIFICATION" in results:
+            st.markdown(f"🧪 **Prediction**: {results['CLASSIFICATION']}")
+            st.markdown(f"💬 **Explanation**: {results.get('EXPLANATION')}")
+
+            with st.expander("🔍 Full Output"):
+                st.dataframe(pd.DataFrame(
+                    [
+                        (name, task["model"], task["version"], results.get(name))
+                        for name, task in AI_TASKS.items()
+                    ],
+                    columns=["TASK", "MODEL", "PROMPT_VERSION", "RESULT"],
+                ))
+        else:
+            st.warning("No prediction available.")
+
+        # Step 3 - Diagnosis Results
+        st.markdown("### 3️⃣ AI Diagnosis")
+
+        # Display results
+        st.success(results.get("DIAGNOSIS", "No diagnosis available."))
+
+        # Code
+        st.markdown("### 🧾 AI Logic")
+
+        with st.expander("🔍 View code"):
+            st.code(
+            '''
+# Define category list for classification
+category_list = ['X-ray', 'CT', 'MRI', 'Ultrasound', 'PET', 'Other']
+
+# AI tasks, each stored per image content hash, model and prompt version
+AI_TASKS = {
+    # Run AI_CLASSIFY to predict category
+    "CLASSIFICATION": call_function(
         "AI_CLASSIFY",
         prompt("Please classify this medical image {0}", col("IMAGE_FILE")),
         category_list
-    )["labels"][0].cast("string").alias("classification")
-
-    # Run AI_COMPLETE for explanation
-    explanation_expr = call_function(
+    )["labels"][0].cast("string"),
+    # Run AI_COMPLETE to generate an explanation
+    "EXPLANATION": call_function(
         "AI_COMPLETE",
         "claude-3-5-sonnet",
         prompt("Explain in one sentence why this is a valid classification for image {0}", col("IMAGE_FILE"))
-    ).alias("explanation")
-
-    result_df = (
-        session.table("MEDICAL_IMAGES")
-        .filter(col("RELATIVE_PATH") == selected_path)
-        .select("RELATIVE_PATH", "IMAGE_FILE", classify_expr, explanation_expr)
-        .to_pandas()
-    )
-
-    # Display results
-    if not result_df.empty:
-        st.markdown(f"🧪 **Prediction**: {result_df['CLASSIFICATION'].iloc[0]}")
-        st.markdown(f"💬 **Explanation**: {result_df['EXPLANATION'].iloc[0]}")
-
-        with st.expander("🔍 Full Output"):
-            st.dataframe(result_df)
-    else:
-        st.warning("No prediction available.")
-
-    # Step 3 - Diagnosis Results
-    st.markdown("### 3️⃣ AI Diagnosis")
-
+    ),
     # Run AI_COMPLETE to generate a diagnosis
-    diagnosis_expr = call_function(
-    "AI_COMPLETE",
-    "claude-3-5-sonnet",
-    prompt("Provide a concise medical diagnosis based on this image {0}.", col("IMAGE_FILE"))
-    ).alias("final_diagnosis")
-
-    # Run classification + explanation + diagnosis
-    result_df = (
-    session.table("MEDICAL_IMAGES")
-    .filter(col("RELATIVE_PATH") == selected_path)
-    .select("RELATIVE_PATH", "IMAGE_FILE", classify_expr, explanation_expr, diagnosis_expr)
-    .to_pandas()
-    )
-
-    # Display results
-    st.success(result_df['FINAL_DIAGNOSIS'][0])
-
-    # Code
-    st.markdown("### 🧾 AI Logic")
-    
-    with st.expander("🔍 View code"):
-        st.code(
-        '''
-# Define category list for classification
-category_list = ['X-ray', 'CT', 'MRI', 'Ultrasound', 'PET', 'Other']
-
-# Run AI_CLASSIFY to predict category
-classify_expr = call_function(
-    "AI_CLASSIFY",
-    prompt("Please classify this medical image {0}", col("IMAGE_FILE")),
-    category_list
-)["labels"][0].cast("string").alias("classification")
-
-# Run AI_COMPLETE to generate an explanation
-explanation_expr = call_function(
-    "AI_COMPLETE",
-    "claude-3-5-sonnet",
-    prompt("Explain in one sentence why this is a valid classification for image {0}", col("IMAGE_FILE"))
-).alias("explanation")
-
-# Filter and execute query
-result_df = (
-    session.table("MEDICAL_IMAGES")
-    .filter(col("RELATIVE_PATH") == selected_path)
-    .select("RELATIVE_PATH", "IMAGE_FILE", classify_expr, explanation_expr)
-    .to_pandas()
-    )
-
-# Run AI_COMPLETE to generate a diagnosis
-diagnosis_expr = call_function(
-    "AI_COMPLETE",
-    "claude-3-5-sonnet",
-    prompt("Provide a concise medical diagnosis based on this image {0}.", col("IMAGE_FILE"))
-    ).alias("final_diagnosis")
+    "DIAGNOSIS": call_function(
+        "AI_COMPLETE",
+        "claude-3-5-sonnet",
+        prompt("Provide a concise medical diagnosis based on this image {0}.", col("IMAGE_FILE"))
+    ),
+}
 
-    # Run classification + explanation + diagnosis
+# Read the stored results, then run only the missing tasks in a single query
+results = read_results(session, [content_hash]).get(content_hash, {})
+missing = [name for name in AI_TASKS if name not in results]
 result_df = (
-    session.table("MEDICAL_IMAGES")
+    staged_images(session)
     .filter(col("RELATIVE_PATH") == selected_path)
-    .select("RELATIVE_PATH", "IMAGE_FILE", classify_expr, explanation_expr, diagnosis_expr)
-    .to_pandas()
+    .select("CONTENT_HASH", "RELATIVE_PATH", *[AI_TASKS[name].alias(name) for name in missing])
+    .collect()
     )
-
-        ''',
-        language="python"
-    )
-
-
-
+# ... and append them to IMAGE_INFERENCE_RESULTS
+
+            ''',
+            language="python"
+        )
+
+with tab3:
+    st.markdown("Classify, explain and diagnose every image under `MEDICAL_IMAGES/` that has no stored results yet. "
+                "Results are stored in `IMAGE_INFERENCE_RESULTS` as each batch completes, so an interrupted run resumes where it stopped.")
+
+    col1, col2, col3 = st.columns(3)
+    batch_size = col1.number_input("Images per batch", min_value=1, max_value=200, value=20)
+    max_concurrency = col2.number_input("Concurrent batches", min_value=1, max_value=16, value=4)
+    max_attempts = col3.number_input("Attempts per image", min_value=1, max_value=10, value=3)
+
+    if st.button("▶️ Process new images"):
+        progress = st.progress(0.0, text="Finding images without results...")
+
+        def show_progress(done, total):
+            progress.progress(done / total, text=f"{done} of {total} images processed")
+
+        processed, failed = run_batch_job(session, batch_size, max_concurrency, max_attempts, show_progress)
+        # Images viewed before the batch may have cached partial results
+        get_inference_results.clear()
+        if processed or failed:
+            progress.progress(1.0, text=f"{processed + failed} images processed")
+        else:
+            progress.empty()
+            st.info("All images already have results.")
+        if processed:
+            st.success(f"Processed {processed} images.")
+        if failed:
+            st.error(f"{failed} images failed after {max_attempts} attempts; run the batch again to retry them.")
+
+    if st.toggle("📊 Show stored results"):
+        st.dataframe(results_overview(session).to_pandas())
@@ -0,0 +1,121 @@
+# Compact previews of the staged medical images for the image picker. Each preview is
+# made once per image content and kept in a bounded local disk cache keyed on the
+# content hash, so the full-resolution image is only downloaded to make its preview.
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+STAGE = "@HC_AISQL_DB.HC_AISQL_SCHEMA.HC_AISQL_STAGE"
+THUMBNAIL_SIZE = (192, 192)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_DIR = os.path.join(tempfile.gettempdir(), "medical_image_thumbnails")
+THUMBNAIL_CACHE_MAX_ENTRIES = 5000  # a few KB each
+THUMBNAIL_MAX_WORKERS = 8
+
+
+def read_image(session, relative_path):
+    """The full-resolution image as bytes."""
+    return session.file.get_stream(f"{STAGE}/{relative_path}", decompress=False).read()
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    """A JPEG preview of an image fitting within `size`, keeping its aspect ratio."""
+    with Image.open(io.BytesIO(data)) as image:
+        # Lets JPEGs decode directly at a reduced scale
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        image.thumbnail(size)
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        return output.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Thumbnails on local disk, one file per content hash, keeping at most
+    `max_entries` and evicting the least recently used. Safe to share across
+    sessions and threads.
+    """
+
+    def __init__(self, directory=THUMBNAIL_CACHE_DIR, max_entries=THUMBNAIL_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Resume with the thumbnails left by a previous process, oldest first
+        files = sorted(os.scandir(directory), key=lambda entry: entry.stat().st_mtime)
+        self.entries = OrderedDict(
+            (entry.name, None) for entry in files if entry.name.endswith(".jpg")
+        )
+        self.evict()
+
+    def file_name(self, content_hash):
+        # ETAGs may hold characters that are not valid in file names
+        return hashlib.md5(content_hash.encode("utf-8")).hexdigest() + ".jpg"
+
+    def get(self, content_hash):
+        name = self.file_name(content_hash)
+        with self.lock:
+            if name not in self.entries:
+                return None
+            self.entries.move_to_end(name)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                return f.read()
+        except OSError:
+            with self.lock:
+                self.entries.pop(name, None)
+            return None
+
+    def put(self, content_hash, data):
+        name = self.file_name(content_hash)
+        path = os.path.join(self.directory, name)
+        # Write then rename, so that readers never see a partial file
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.entries[name] = None
+            self.entries.move_to_end(name)
+            self.evict()
+
+    def evict(self):
+        while len(self.entries) > self.max_entries:
+            name, _ = self.entries.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def get_thumbnails(session, cache, images):
+    """
+    Thumbnails of the given (relative path, content hash) pairs as {content hash: bytes},
+    making the missing ones concurrently. Images that cannot be read map to None.
+    """
+    thumbnails = {content_hash: cache.get(content_hash) for _, content_hash in images}
+    missing = {
+        content_hash: relative_path
+        for relative_path, content_hash in images
+        if thumbnails[content_hash] is None
+    }
+
+    def make(content_hash):
+        try:
+            thumbnail = make_thumbnail(read_image(session, missing[content_hash]))
+        except Exception:
+            return None
+        cache.put(content_hash, thumbnail)
+        return thumbnail
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(THUMBNAIL_MAX_WORKERS, len(missing))) as executor:
+            thumbnails.update(zip(missing, executor.map(make, missing)))
+    return thumbnails